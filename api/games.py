@@ -1,18 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-import models, schemas # auth не нужен, если список игр публичный
+from fastapi import APIRouter, HTTPException, Request, Response
+from catalog import catalog, CachedBody
+from config import settings
+from pagination import decode_cursor, encode_cursor, page_size, NEXT_CURSOR_HEADER
+import schemas # auth не нужен, если список игр публичный
 
 router = APIRouter(prefix="/games", tags=["games"])
 
+def _cached_response(request: Request, cached: CachedBody, headers: dict = None) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": f"public, max-age={settings.CATALOG_MAX_AGE}", **(headers or {})}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or cached.etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @router.get("/", response_model=list[schemas.Game])
-def read_games(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    games = db.query(models.Game).offset(skip).limit(limit).all()
-    return games
+async def read_games(request: Request, cursor: str | None = None, limit: int = settings.PAGE_SIZE_DEFAULT, is_active: bool | None = None):
+    # Servi depuis le catalogue en mémoire (aucune requête SQL), pagination par curseur
+    await catalog.ensure_loaded()
+    after = decode_cursor(cursor) if cursor else None
+    cached, next_key = catalog.page(after, page_size(limit), is_active)
+    headers = {NEXT_CURSOR_HEADER: encode_cursor(*next_key)} if next_key else None
+    return _cached_response(request, cached, headers)
+
+@router.get("/slug/{slug}", response_model=schemas.Game)
+async def read_game_by_slug(slug: str, request: Request):
+    await catalog.ensure_loaded()
+    cached = catalog.get_by_slug(slug)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return _cached_response(request, cached)
 
 @router.get("/{game_id}", response_model=schemas.Game)
-def read_game(game_id: int, db: Session = Depends(get_db)):
-    db_game = db.query(models.Game).filter(models.Game.id == game_id).first()
-    if not db_game:
+async def read_game(game_id: int, request: Request):
+    await catalog.ensure_loaded()
+    cached = catalog.get(game_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Game not found")
-    return db_game
\ No newline at end of file
+    return _cached_response(request, cached)
@@ -1,30 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 import models, schemas, auth
+from matchmaker import matchmaker, persist_matches, player_context, naive_utc
+from availability import availability_index
+from scoring import SKILL_TIERS, TIER_INDEX
+from pagination import keyset, page_size, set_next_cursor, next_cursor_headers
+from serialization import projection, rows_response
+from notifications import hub
+from catalog import catalog
+from config import settings
 
 router = APIRouter(prefix="/matchmaking", tags=["matchmaking"])
 
+async def _existing_game_ids(db: AsyncSession, game_ids: set[int]) -> set[int]:
+    # Catalogue en mémoire d'abord ; la BD seulement pour un jeu ajouté depuis le dernier rechargement
+    await catalog.ensure_loaded()
+    known = {game_id for game_id in game_ids if game_id in catalog}
+    unknown = game_ids - known
+    if unknown:
+        result = await db.execute(select(models.Game.id).where(models.Game.id.in_(unknown)))
+        known.update(result.scalars())
+    return known
+
+async def _match_new_requests(db: AsyncSession, user_id: int, db_requests: list[models.MatchRequest]):
+    # Appariement immédiat avec le pool en mémoire, puis un seul commit
+    rows, filled, contexts, journal = [], [], {}, []
+    for db_request in db_requests:
+        if db_request.game_id not in contexts:
+            contexts[db_request.game_id] = await player_context(db, user_id, db_request.game_id)
+        tier, profile = contexts[db_request.game_id]
+        request_rows, request_filled = matchmaker.submit(db_request, tier, profile, journal=journal)
+        rows.extend(request_rows)
+        filled.extend(request_filled)
+    try:
+        # Plusieurs workers : places réservées avant l'insertion (candidat déjà pris ailleurs abandonné)
+        rows, filled = await matchmaker.claim(journal, rows, filled)
+    except Exception:
+        matchmaker.revert(journal)
+        raise
+    if not rows and not filled:
+        await matchmaker.broadcast(db_request.id for db_request in db_requests)
+        return
+    try:
+        matches = await persist_matches(db, rows, filled)
+        await db.commit()
+    except Exception:
+        # Le pool a été modifié avant le commit : on le remet d'accord avec la BD
+        await db.rollback()
+        matchmaker.revert(journal)
+        await matchmaker.release(journal)
+        raise
+    finally:
+        # Autres workers : nouvelles requêtes en attente, candidats appariés ou complets
+        await matchmaker.broadcast({db_request.id for db_request in db_requests} | {row["match_request_id"] for row in rows})
+    filled = set(filled)
+    for db_request in db_requests:
+        if db_request.id in filled:
+            db_request.status = "matched"
+    for match in matches:
+        await hub.publish(match.matched_user_id, "match.created", schemas.Match.model_validate(match).model_dump(mode="json"))
+
 @router.post("/requests/", response_model=schemas.MatchRequest)
-def create_match_request(request: schemas.MatchRequestCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    # On peut ajouter des vérifications, par exemple, si le jeu existe
-    db_game = db.query(models.Game).filter(models.Game.id == request.game_id).first()
-    if not db_game:
+async def create_match_request(request: schemas.MatchRequestCreate, current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    # On vérifie que le jeu existe
+    if not await _existing_game_ids(db, {request.game_id}):
          raise HTTPException(status_code=400, detail="Game not found")
 
     db_request = models.MatchRequest(user_id=current_user.id, **request.dict())
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    await db.commit()
+    await db.refresh(db_request)
+    await _match_new_requests(db, current_user.id, [db_request])
     return db_request
 
+@router.post("/requests/batch", response_model=list[schemas.MatchRequestBatchItem])
+async def create_match_requests_batch(batch: schemas.MatchRequestBatchCreate, current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    # Escouade / lobby : une vérification des jeux, un INSERT multi-lignes, une transaction
+    known_games = await _existing_game_ids(db, {item.game_id for item in batch.items})
+    results = [schemas.MatchRequestBatchItem(index=i, ok=False, error="Game not found") for i in range(len(batch.items))]
+    valid = [(i, item) for i, item in enumerate(batch.items) if item.game_id in known_games]
+    if valid:
+        rows = [{"user_id": current_user.id, "status": "active", **item.dict()} for _, item in valid]
+        if db.get_bind().dialect.insert_executemany_returning:
+            # "insertmanyvalues" : INSERT ... VALUES (...), (...) RETURNING en un seul aller-retour.
+            # Pas de sort_by_parameter_order (SQLite repasserait à une ligne par requête) :
+            # les ids auto-incrémentés suivent l'ordre des VALUES, on retrie donc par id.
+            result = await db.scalars(insert(models.MatchRequest).returning(models.MatchRequest), rows)
+            db_requests = sorted(result.all(), key=lambda db_request: db_request.id)
+        else:
+            # MySQL n'a pas RETURNING : un INSERT multi-lignes, puis une relecture à partir de lastrowid
+            # (premier id attribué par l'INSERT). Filtre sur l'utilisateur : un autre INSERT concurrent
+            # peut intercaler ses ids selon innodb_autoinc_lock_mode.
+            result = await db.execute(insert(models.MatchRequest).values(rows))
+            result = await db.scalars(
+                select(models.MatchRequest)
+                .where(models.MatchRequest.id >= result.lastrowid, models.MatchRequest.user_id == current_user.id)
+                .order_by(models.MatchRequest.id).limit(len(rows))
+            )
+            db_requests = result.all()
+        await db.commit()
+        await _match_new_requests(db, current_user.id, db_requests)
+        for (i, _), db_request in zip(valid, db_requests):
+            results[i] = schemas.MatchRequestBatchItem(index=i, ok=True, request=schemas.MatchRequest.model_validate(db_request))
+    return results
+
+def my_requests_query(user_id: int, cursor: str | None, limit: int, status: str | None = None, game_id: int | None = None):
+    columns = projection(models.MatchRequest, schemas.MatchRequest) if settings.FAST_JSON else [models.MatchRequest]
+    query = select(*columns).where(models.MatchRequest.user_id == user_id)
+    if status is not None:
+        query = query.where(models.MatchRequest.status == status)
+    if game_id is not None:
+        query = query.where(models.MatchRequest.game_id == game_id)
+    return keyset(query, models.MatchRequest, cursor, limit)
+
+def my_matches_query(user_id: int, cursor: str | None, limit: int, status: models.MatchStatusEnum | None = None,
+                     game_id: int | None = None):
+    # On suppose que l'utilisateur voit les matchs où il était "matched_user"
+    columns = projection(models.Match, schemas.Match) if settings.FAST_JSON else [models.Match]
+    query = select(*columns).where(models.Match.matched_user_id == user_id)
+    if status is not None:
+        query = query.where(models.Match.status == status)
+    if game_id is not None:
+        query = query.where(models.Match.game_id == game_id)
+    return keyset(query, models.Match, cursor, limit)
+
 @router.get("/requests/me", response_model=list[schemas.MatchRequest])
-def read_my_match_requests(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    requests = db.query(models.MatchRequest).filter(models.MatchRequest.user_id == current_user.id).all()
+async def read_my_match_requests(response: Response, cursor: str | None = None, limit: int = settings.PAGE_SIZE_DEFAULT,
+                                 status: str | None = None, game_id: int | None = None,
+                                 current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    limit = page_size(limit)
+    result = await db.execute(my_requests_query(current_user.id, cursor, limit, status, game_id))
+    if settings.FAST_JSON:
+        rows = result.all()
+        return rows_response(rows, next_cursor_headers(rows, limit))
+    requests = result.scalars().all()
+    set_next_cursor(response, requests, limit)
     return requests
 
 @router.get("/matches/me", response_model=list[schemas.Match])
-def read_my_matches(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-     # On suppose que l'utilisateur voit les matchs où il était "matched_user"
-    matches = db.query(models.Match).filter(models.Match.matched_user_id == current_user.id).all()
-    return matches
\ No newline at end of file
+async def read_my_matches(response: Response, cursor: str | None = None, limit: int = settings.PAGE_SIZE_DEFAULT,
+                          status: models.MatchStatusEnum | None = None, game_id: int | None = None,
+                          current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    limit = page_size(limit)
+    result = await db.execute(my_matches_query(current_user.id, cursor, limit, status, game_id))
+    if settings.FAST_JSON:
+        rows = result.all()
+        return rows_response(rows, next_cursor_headers(rows, limit))
+    matches = result.scalars().all()
+    set_next_cursor(response, matches, limit)
+    return matches
+
+@router.get("/candidates", response_model=list[schemas.Candidate])
+async def find_candidates(game_id: int, skill_level: list[str] | None = Query(None), request_type: str | None = None,
+                          available_from: datetime | None = None, available_until: datetime | None = None,
+                          limit: int = settings.PAGE_SIZE_DEFAULT,
+                          current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    # "Qui est disponible ?" : servi par l'index en mémoire, sans lire les colonnes JSON en SQL
+    if not await _existing_game_ids(db, {game_id}):
+        raise HTTPException(status_code=400, detail="Game not found")
+    if skill_level:
+        unknown = [level for level in skill_level if level not in TIER_INDEX]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown skill level: {', '.join(unknown)}")
+        tiers = sorted({TIER_INDEX[level] for level in skill_level})
+    else:
+        # Par défaut autour du niveau du joueur ; au-dessus pour un mentor, en dessous pour un élève
+        tier = availability_index.tier_of(current_user.id, game_id) or 0
+        if request_type == models.RequestTypeEnum.find_mentor.value:
+            tiers = range(tier + 1, len(SKILL_TIERS))
+        elif request_type == models.RequestTypeEnum.find_student.value:
+            tiers = range(0, tier)
+        else:
+            tiers = [t for t in (tier - 1, tier, tier + 1) if 0 <= t < len(SKILL_TIERS)]
+    start = naive_utc(available_from) if available_from else datetime.utcnow()
+    end = naive_utc(available_until) if available_until else start + timedelta(hours=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="available_until must be after available_from")
+    candidates = availability_index.candidates(game_id, tiers, start, end, exclude_user=current_user.id, limit=page_size(limit))
+    return [schemas.Candidate(user_id=c.user_id, skill_level=SKILL_TIERS[c.tier], is_main_game=c.is_main_game,
+                              available_now=c.available_now, coverage=c.coverage) for c in candidates]
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+# Format texte Prometheus (scrapé par le serveur de monitoring)
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
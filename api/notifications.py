@@ -0,0 +1,83 @@
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from database import AsyncSessionLocal
+from notifications import hub
+from config import settings
+import auth
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+async def _authenticate(token: str) -> auth.Principal:
+    # Session courte : on ne garde pas de connexion BD pendant toute la durée du flux
+    async with AsyncSessionLocal() as db:
+        return await auth.authenticate_principal(token, db)
+
+@router.websocket("/ws")
+async def notifications_ws(websocket: WebSocket, token: str | None = None):
+    # Les navigateurs ne peuvent pas envoyer d'en-tête Authorization en WebSocket : ?token= accepté aussi
+    authorization = websocket.headers.get("authorization", "")
+    token = token or (authorization[7:] if authorization.lower().startswith("bearer ") else None)
+    try:
+        user = await _authenticate(token or "")
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    queue = hub.connect(user.id)
+
+    async def pump():
+        try:
+            while True:
+                await websocket.send_json(await queue.get())
+        except WebSocketDisconnect:
+            pass
+
+    async def drain():
+        try:
+            while True:
+                await websocket.receive_text() # messages du client ignorés ; sert à détecter la déconnexion
+        except WebSocketDisconnect:
+            pass
+
+    # Fin de l'un ou de l'autre : déconnexion, ou envoi impossible (message non sérialisable, socket
+    # cassé). Dans ce cas on ferme plutôt que de garder ouverte une connexion qui ne reçoit plus rien.
+    sender, receiver = asyncio.create_task(pump()), asyncio.create_task(drain())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        errors = [task.exception() for task in done if task.exception() is not None]
+        for error in errors:
+            logger.error("Notification WebSocket failed", exc_info=error)
+        if errors:
+            try:
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            except Exception:
+                pass # socket déjà fermé
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+        hub.disconnect(user.id, queue)
+
+@router.get("/stream")
+async def notifications_sse(token: str = Depends(auth.oauth2_scheme)):
+    user = await _authenticate(token)
+    queue = hub.connect(user.id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.NOTIFY_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            hub.disconnect(user.id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,30 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from database import get_async_db
+from serialization import projection
+from availability import availability_index
+from write_behind import record_presence, write_behind
 import models, schemas, auth
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
+# Uniquement les colonnes exposées par schemas.UserProfile (pas les JSON de préférences)
+_PROFILE_COLUMNS = projection(models.UserProfile, schemas.UserProfile)
+_PROFILE_FIELDS = list(schemas.UserProfile.model_fields)
+
+def my_profile_query(user_id: int):
+    return select(models.UserProfile).options(load_only(*_PROFILE_COLUMNS)).where(models.UserProfile.user_id == user_id).limit(1)
+
+def _with_pending_presence(db_profile):
+    # Présence reçue par heartbeat mais pas encore écrite en BD : on renvoie la valeur la plus récente
+    db_profile.is_available_now = write_behind.get(models.UserProfile.is_available_now, db_profile.user_id, db_profile.is_available_now)
+    return db_profile
+
 @router.get("/me", response_model=schemas.UserProfile)
-def read_my_profile(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    db_profile = db.query(models.UserProfile).filter(models.UserProfile.user_id == current_user.id).first()
+async def read_my_profile(current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(my_profile_query(current_user.id))
+    db_profile = result.scalars().first()
     if not db_profile:
          # On peut créer automatiquement un profil vide ou retourner 404
          raise HTTPException(status_code=404, detail="Profile not found")
-    return db_profile
+    return _with_pending_presence(db_profile)
 
 @router.put("/me", response_model=schemas.UserProfile)
-def update_my_profile(profile_update: schemas.UserProfileUpdate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    db_profile = db.query(models.UserProfile).filter(models.UserProfile.user_id == current_user.id).first()
+async def update_my_profile(profile_update: schemas.UserProfileUpdate, current_user: auth.Principal = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(my_profile_query(current_user.id))
+    db_profile = result.scalars().first()
+    update_data = profile_update.dict(exclude_unset=True)
+    if "is_available_now" in update_data:
+        await write_behind.discard(models.UserProfile.is_available_now, current_user.id) # heartbeat en attente : valeur plus ancienne
     if not db_profile:
         # Créer un nouveau profil
-        db_profile = models.UserProfile(user_id=current_user.id, **profile_update.dict(exclude_unset=True))
+        db_profile = models.UserProfile(user_id=current_user.id, **update_data)
         db.add(db_profile)
     else:
         # Mettre à jour l'existant
-        update_data = profile_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_profile, key, value)
-    db.commit()
-    db.refresh(db_profile)
-    return db_profile
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_profile, attribute_names=_PROFILE_FIELDS)
+    return _with_pending_presence(db_profile)
+
+@router.post("/me/heartbeat", status_code=status.HTTP_202_ACCEPTED, response_class=Response)
+async def heartbeat(beat: schemas.Heartbeat, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    # Appelé fréquemment par les clients : index des disponibilités à jour tout de suite, BD par lot
+    record_presence(current_user.id, beat.is_available_now)
+    availability_index.set_available_now(current_user.id, beat.is_available_now)
+    return Response(status_code=status.HTTP_202_ACCEPTED)
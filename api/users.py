@@ -1,44 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 import models, schemas, auth
-from datetime import timedelta
+from datetime import datetime, timedelta
 from config import settings
+from write_behind import record_login
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Vérification de l'unicité de l'email et du nom d'utilisateur
-    db_user = db.query(models.User).filter(
+    result = await db.execute(select(models.User.id).where(
         (models.User.email == user.email) | (models.User.username == user.username)
-    ).first()
+    ).limit(1))
+    db_user = result.first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email ou nom d'utilisateur déjà enregistré")
+    await db.rollback() # pas de connexion gardée pendant le hachage
     # Hachage du mot de passe
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.password_hasher.hash(user.password)
     db_user = models.User(email=user.email, username=user.username, password_hash=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, user_credentials.username_or_email, user_credentials.password)
+async def login_user(user_credentials: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await auth.authenticate_user(db, user_credentials.username_or_email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur/email ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    record_login(user.id, datetime.utcnow()) # écrit par lot, hors du chemin de la requête
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=auth.token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Exemple d'endpoint protégé
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: auth.CurrentUser = Depends(auth.get_current_user)):
     return current_user
\ No newline at end of file
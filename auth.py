@@ -1,15 +1,35 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from config import settings
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from database import get_async_db
 import models
 import schemas
+from metrics import Histogram, collector, metric_lines
+from cache import TTLCache
+from shared_state import SharedState, WORKER_ID
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def parse_signing_keys(spec: str) -> dict:
+    # "kid1:secret1,kid2:secret2" -> {"kid1": "secret1", "kid2": "secret2"}
+    keys = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kid, _, secret = item.partition(":")
+        keys[kid.strip()] = secret.strip()
+    return keys
+
+SIGNING_KEYS = parse_signing_keys(settings.JWT_KEYS) or {"default": settings.SECRET_KEY}
+ACTIVE_KID = settings.JWT_ACTIVE_KID or next(iter(SIGNING_KEYS))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login") # URL для получения токена
 
 def verify_password(plain_password, hashed_password):
@@ -18,13 +38,81 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, username_or_email: str, password: str):
+class PasswordHasher:
+    # bcrypt dans un pool borné : au-delà de workers + queue_limit tâches, on rejette (503)
+    # au lieu de laisser la file grossir et les temps de réponse exploser.
+    def __init__(self, workers: int, queue_limit: int, executor: str = "thread"):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self.executor_kind = executor
+        self.pending = 0
+        self.rejected = 0
+        # Durée d'un appel, attente dans le pool comprise (c'est ce que voit la requête)
+        self.durations = {"hash": Histogram(), "verify": Histogram()}
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args):
+        # `pending` n'est modifié que depuis la boucle d'événements : pas besoin de verrou
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, retry later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.durations[operation].observe(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(settings.HASH_WORKERS, settings.HASH_QUEUE_LIMIT, settings.HASH_EXECUTOR)
+
+@collector
+def _hasher_samples():
+    return (
+        metric_lines("password_hash_pending", "gauge", "Hash/verify calls running or queued", [({}, password_hasher.pending)])
+        + metric_lines("password_hash_rejected_total", "counter", "Hash/verify calls rejected with 503", [({}, password_hasher.rejected)])
+        + metric_lines("password_hash_duration_seconds", "histogram", "Duration of one bcrypt hash/verify call", [])
+        + [line for operation, histogram in password_hasher.durations.items()
+           for line in histogram.samples("password_hash_duration_seconds", {"operation": operation})]
+    )
+
+def login_query(username_or_email: str):
     # Проверяем по username или email
-    user = db.query(models.User).filter(
+    return select(models.User).options(load_only(models.User.id, models.User.password_hash, models.User.is_active, models.User.is_banned)).where(
         (models.User.username == username_or_email) |
         (models.User.email == username_or_email)
-    ).first()
-    if not user or not verify_password(password, user.password_hash):
+    ).limit(1)
+
+async def authenticate_user(db: AsyncSession, username_or_email: str, password: str):
+    result = await db.execute(login_query(username_or_email))
+    user = result.scalars().first()
+    if user is not None:
+        db.expunge(user) # garde les colonnes chargées malgré le rollback
+    # Connexion rendue au pool avant d'attendre bcrypt (file du hasher plus longue que le pool)
+    await db.rollback()
+    if not user or not await password_hasher.verify(password, user.password_hash):
         return False
     return user
 
@@ -35,24 +123,193 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEYS[ACTIVE_KID], algorithm=settings.ALGORITHM, headers={"kid": ACTIVE_KID})
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+class TokenRevocations:
+    # Version des jetons par utilisateur : un jeton dont "ver" est inférieur à la version courante
+    # est révoqué. Une révocation n'est gardée que la durée de vie d'un jeton (les plus anciens ont
+    # expiré d'eux-mêmes) : la table ne contient que les révocations récentes. Les versions sont
+    # des horodatages en millisecondes : après un redémarrage, une version rechargée dépasse
+    # toutes celles déjà émises, même si la table en mémoire est repartie de zéro.
+    CHANNEL = "auth.revoke"
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._versions = OrderedDict() # user_id -> (version, expire_at), par ordre d'expiration
+        self._state = None
+
+    def __len__(self):
+        return len(self._versions)
+
+    def _prune(self, now: float):
+        while self._versions:
+            user_id, (_, expire_at) = next(iter(self._versions.items()))
+            if expire_at > now:
+                break
+            del self._versions[user_id]
+
+    def version(self, user_id: int) -> int:
+        self._prune(time.monotonic())
+        entry = self._versions.get(user_id)
+        return entry[0] if entry else 0
+
+    def _set(self, user_id: int, version: int):
+        self._versions[user_id] = (version, time.monotonic() + self.ttl)
+        self._versions.move_to_end(user_id)
+
+    def revoke(self, user_id: int):
+        version = max(self.version(user_id) + 1, int(time.time() * 1000))
+        self._set(user_id, version)
+        if self._state is not None:
+            self._state.publish_soon(self.CHANNEL, {"origin": WORKER_ID, "user_id": user_id, "version": version})
+
+    def use_shared_state(self, state: SharedState):
+        # Les autres workers appliquent la même révocation et oublient l'utilisateur en cache
+        self._state = state
+        state.subscribe(self.CHANNEL, self._on_remote_revoke)
+
+    def _on_remote_revoke(self, message: dict):
+        if message["origin"] != WORKER_ID:
+            user_id = message["user_id"]
+            self._set(user_id, max(message["version"], self.version(user_id)))
+            invalidate_user(user_id)
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        return version < self.version(user_id)
+
+    async def bootstrap(self, db: AsyncSession):
+        # Après un redémarrage : les comptes bannis/désactivés pendant la durée de vie d'un jeton
+        since = datetime.utcnow() - timedelta(seconds=self.ttl)
+        result = await db.execute(select(models.User.id).where(
+            (models.User.is_banned == True) | (models.User.is_active == False), models.User.updated_at >= since
+        ))
+        for user_id in result.scalars():
+            self.revoke(user_id)
+
+revocations = TokenRevocations(settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+@collector
+def _revocation_samples():
+    return metric_lines("token_revocations", "gauge", "Users with recently revoked tokens", [({}, len(revocations))])
+
+def token_claims(user) -> dict:
+    # Claims minimales pour le mode sans BD (AUTH_STATELESS) ; "sub" reste pour le mode classique
+    return {"sub": str(user.id), "uid": user.id, "act": bool(user.is_active), "ban": bool(user.is_banned),
+            "ver": revocations.version(user.id)}
+
+class CurrentUser:
+    # Instantané immuable de l'utilisateur authentifié (ce dont les routes ont besoin)
+    __slots__ = ("id", "uuid", "email", "username", "is_active", "is_banned", "created_at")
+
+    def __init__(self, id, uuid, email, username, is_active, is_banned, created_at):
+        for name, value in zip(self.__slots__, (id, uuid, email, username, is_active, is_banned, created_at)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CurrentUser is immutable")
+
+_CURRENT_USER_COLUMNS = [getattr(models.User, name) for name in CurrentUser.__slots__]
+
+def current_user_query(user_id: int):
+    return select(*_CURRENT_USER_COLUMNS).where(models.User.id == user_id)
+
+user_cache = TTLCache("user", settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+token_cache = TTLCache("token", settings.TOKEN_CACHE_SIZE, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+# Bannissement / désactivation : l'utilisateur doit être relu au prochain appel
+@event.listens_for(models.User.is_banned, "set")
+@event.listens_for(models.User.is_active, "set")
+def _on_user_status_change(target, value, oldvalue, initiator):
+    if target.id is not None and value != oldvalue:
+        invalidate_user(target.id)
+        revocations.revoke(target.id) # les jetons sans BD portent l'ancien statut : on les invalide
+
+def decode_token(token: str) -> dict:
+    # Cache indexé par la signature : évite de refaire le HMAC pour les jetons fréquents.
+    # On compare aussi l'en-tête + payload signés, pour ne jamais servir un payload modifié.
+    signed, _, signature = token.rpartition(".")
+    cached = token_cache.get(signature)
+    if cached is not None and cached[0] == signed:
+        return cached[1]
+    # "kid" choisit la clé (rotation) ; un jeton sans "kid" date d'avant la rotation : SECRET_KEY
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is not None and not isinstance(kid, str):
+        raise JWTError("Unknown signing key") # en-tête forgé (liste, objet...) : pas de 500
+    key = SIGNING_KEYS.get(kid) if kid else settings.SECRET_KEY
+    if not key:
+        raise JWTError("Unknown signing key")
+    payload = jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+    ttl = payload.get("exp", 0) - time.time()
+    if ttl > 0:
+        token_cache.set(signature, (signed, payload), ttl=min(ttl, token_cache.ttl))
+    return payload
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _inactive_exception() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive or banned user")
+
+async def authenticate_token(token: str, db: AsyncSession) -> CurrentUser:
+    # Partagé par les routes HTTP (get_current_user) et les canaux temps réel (WebSocket/SSE)
+    credentials_exception = _credentials_exception()
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_token(token)
         user_id: int = payload.get("sub")
         if user_id is None:
             raise credentials_exception
         token_data = schemas.TokenData(user_id=user_id)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.id == token_data.user_id).first()
+    user = user_cache.get(token_data.user_id)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        result = await db.execute(current_user_query(token_data.user_id))
+        row = result.first()
+        if row is None:
+            raise credentials_exception
+        user = CurrentUser(*row)
+        user_cache.set(user.id, user)
+    if not user.is_active or user.is_banned:
+        raise _inactive_exception()
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    return await authenticate_token(token, db)
+
+class Principal:
+    # Identité minimale pour les routes qui n'ont besoin que de l'id de l'utilisateur
+    __slots__ = ("id", "is_active", "is_banned")
+
+    def __init__(self, id, is_active, is_banned):
+        self.id = id
+        self.is_active = is_active
+        self.is_banned = is_banned
+
+async def authenticate_principal(token: str, db: AsyncSession) -> Principal:
+    # Mode sans BD : signature + expiration + version du jeton, tout en mémoire.
+    # Les jetons émis avant ces claims (pas de "uid") passent par la vérification classique.
+    if settings.AUTH_STATELESS:
+        try:
+            payload = decode_token(token)
+        except JWTError:
+            raise _credentials_exception()
+        user_id = payload.get("uid")
+        if user_id is not None:
+            if revocations.is_revoked(user_id, payload.get("ver", 0)):
+                raise _credentials_exception()
+            if not payload.get("act", True) or payload.get("ban", False):
+                raise _inactive_exception()
+            return Principal(user_id, True, False)
+    user = await authenticate_token(token, db)
+    return Principal(user.id, user.is_active, user.is_banned)
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    return await authenticate_principal(token, db)
\ No newline at end of file
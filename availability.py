@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal
+from matchmaker import skill_tier
+from metrics import collector, metric_lines
+from shared_state import SharedState, WORKER_ID
+import models
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _utc_offset_hours(tz_name: str | None, now: datetime) -> int:
+    # Décalage actuel du fuseau (heure d'été comprise), arrondi à l'heure la plus proche ; les
+    # fuseaux à la demi-heure (+5:30, -3:30) sont tous arrondis vers le haut, pas au pair comme round()
+    if not tz_name:
+        return 0
+    try:
+        offset = now.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name)).utcoffset()
+    except (ZoneInfoNotFoundError, ValueError):
+        return 0
+    return math.floor(offset.total_seconds() / 3600 + 0.5)
+
+
+def _parse_range(value: str) -> tuple[int, int] | None:
+    # "18:00-23:30" -> (18, 24) : heures entamées
+    try:
+        start, end = (part.strip() for part in str(value).split("-", 1))
+        start_h, start_m = (int(x) for x in (start.split(":") + ["0"])[:2])
+        end_h, end_m = (int(x) for x in (end.split(":") + ["0"])[:2])
+    except ValueError:
+        return None
+    end_h += end_m > 0
+    if end_h <= start_h:
+        end_h += 24 # plage qui passe minuit
+    return start_h, min(end_h, start_h + 24)
+
+
+def schedule_slots(schedule, tz_name: str | None = None, now: datetime = None) -> frozenset:
+    # availability_schedule en heure locale, ex. {"mon": ["18:00-23:00"], "sat": ["10:00-14:00"]}
+    # -> créneaux horaires UTC de la semaine (0 = lundi 0h UTC, 167 = dimanche 23h UTC)
+    if not isinstance(schedule, dict):
+        return frozenset()
+    offset = _utc_offset_hours(tz_name, now or datetime.utcnow())
+    slots = set()
+    for day, ranges in schedule.items():
+        day = str(day)[:3].lower()
+        if day not in DAYS:
+            continue
+        for value in ranges if isinstance(ranges, list) else [ranges]:
+            hours = _parse_range(value)
+            if hours is not None:
+                base = DAYS.index(day) * 24 - offset
+                slots.update((base + h) % HOURS_PER_WEEK for h in range(*hours))
+    return frozenset(slots)
+
+
+def slot_of(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+def window_slots(start: datetime, end: datetime) -> list[int]:
+    # Créneaux UTC couverts par [start, end), une semaine au plus
+    start = start.replace(minute=0, second=0, microsecond=0)
+    hours = max(1, min(HOURS_PER_WEEK, int(-(-(end - start).total_seconds() // 3600))))
+    return [slot_of(start + timedelta(hours=h)) for h in range(hours)]
+
+
+class Candidate:
+    __slots__ = ("user_id", "tier", "is_main_game", "available_now", "coverage")
+
+    def __init__(self, user_id, tier, is_main_game, available_now, coverage):
+        self.user_id = user_id
+        self.tier = tier
+        self.is_main_game = is_main_game
+        self.available_now = available_now
+        self.coverage = coverage
+
+
+class _Profile:
+    __slots__ = ("schedule", "timezone", "available_now", "slots")
+
+    def __init__(self):
+        self.schedule = None
+        self.timezone = None
+        self.available_now = False
+        self.slots = frozenset()
+
+
+class AvailabilityIndex:
+    # Index en mémoire jeu -> tier -> créneau horaire UTC -> joueurs, plus jeu -> tier -> joueurs
+    # "disponibles maintenant". Reconstruit au démarrage puis tenu à jour par les commits ORM
+    # (événements de session plus bas) et un rechargement périodique pour les écritures hors ORM.
+    CHANNEL = "availability"
+    _REMOTE_OPS = ("set_profile", "remove_profile", "set_user_game", "remove_user_game")
+
+    def __init__(self):
+        self._slots = {}
+        self._now = {}
+        self._profiles = {}
+        self._user_games = {} # user_id -> {game_id: (tier, is_main_game)}
+        self._lock = threading.Lock()
+        self._state = None
+
+    def __len__(self):
+        return len(self._user_games)
+
+    def use_shared_state(self, state: SharedState):
+        # Plusieurs workers : chaque modification (commit ORM, heartbeat) est rejouée par les autres
+        # index, sans attendre leur rechargement périodique
+        self._state = state
+        state.subscribe(self.CHANNEL, self._on_remote_change)
+
+    def _publish(self, op: str, *args):
+        if self._state is not None:
+            self._state.publish_soon(self.CHANNEL, {"origin": WORKER_ID, "op": op, "args": args})
+
+    def _on_remote_change(self, message: dict):
+        if message["origin"] != WORKER_ID and message["op"] in self._REMOTE_OPS:
+            getattr(self, "_" + message["op"])(*message["args"])
+
+    def _unindex(self, user_id: int):
+        profile = self._profiles.get(user_id)
+        for game_id, (tier, _) in self._user_games.get(user_id, {}).items():
+            tiers = self._slots.get(game_id, {}).get(tier, {})
+            for slot in profile.slots if profile else ():
+                tiers.get(slot, set()).discard(user_id)
+            self._now.get(game_id, {}).get(tier, set()).discard(user_id)
+
+    def _index(self, user_id: int):
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            return
+        for game_id, (tier, _) in self._user_games.get(user_id, {}).items():
+            tiers = self._slots.setdefault(game_id, {}).setdefault(tier, {})
+            for slot in profile.slots:
+                tiers.setdefault(slot, set()).add(user_id)
+            if profile.available_now:
+                self._now.setdefault(game_id, {}).setdefault(tier, set()).add(user_id)
+
+    def set_profile(self, user_id: int, values: dict, now: datetime = None):
+        # `values` : colonnes chargées de UserProfile ; les colonnes absentes gardent leur valeur indexée
+        self._set_profile(user_id, values, now)
+        self._publish("set_profile", user_id, values)
+
+    def _set_profile(self, user_id: int, values: dict, now: datetime = None):
+        with self._lock:
+            self._unindex(user_id)
+            profile = self._profiles.get(user_id) or _Profile()
+            for name in ("schedule", "timezone", "available_now"):
+                if name in values:
+                    setattr(profile, name, values[name])
+            profile.available_now = bool(profile.available_now)
+            profile.slots = schedule_slots(profile.schedule, profile.timezone, now)
+            self._profiles[user_id] = profile
+            self._index(user_id)
+
+    def remove_profile(self, user_id: int):
+        self._remove_profile(user_id)
+        self._publish("remove_profile", user_id)
+
+    def _remove_profile(self, user_id: int):
+        with self._lock:
+            self._unindex(user_id)
+            self._profiles.pop(user_id, None)
+
+    def set_user_game(self, user_id: int, game_id: int, tier: int = None, is_main_game: bool = None):
+        # None : on garde la valeur indexée (ou la valeur par défaut de la colonne pour une nouvelle ligne)
+        self._set_user_game(user_id, game_id, tier, is_main_game)
+        self._publish("set_user_game", user_id, game_id, tier, is_main_game)
+
+    def _set_user_game(self, user_id: int, game_id: int, tier: int = None, is_main_game: bool = None):
+        with self._lock:
+            self._unindex(user_id)
+            games = self._user_games.setdefault(user_id, {})
+            current_tier, current_main = games.get(game_id, (skill_tier(None), False))
+            games[game_id] = (current_tier if tier is None else tier, current_main if is_main_game is None else bool(is_main_game))
+            self._index(user_id)
+
+    def remove_user_game(self, user_id: int, game_id: int):
+        self._remove_user_game(user_id, game_id)
+        self._publish("remove_user_game", user_id, game_id)
+
+    def _remove_user_game(self, user_id: int, game_id: int):
+        with self._lock:
+            self._unindex(user_id)
+            games = self._user_games.get(user_id, {})
+            games.pop(game_id, None)
+            if not games:
+                self._user_games.pop(user_id, None)
+            self._index(user_id)
+
+    def set_available_now(self, user_id: int, available: bool):
+        # Heartbeat d'un joueur sans ligne UserProfile : l'UPDATE différé ne touche aucune ligne,
+        # l'index ne doit pas non plus le faire apparaître comme disponible
+        if user_id not in self._profiles:
+            return
+        self.set_profile(user_id, {"available_now": available})
+
+    def tier_of(self, user_id: int, game_id: int) -> int | None:
+        entry = self._user_games.get(user_id, {}).get(game_id)
+        return entry[0] if entry else None
+
+    def candidates(self, game_id: int, tiers, start: datetime, end: datetime, now: datetime = None,
+                   exclude_user: int = None, limit: int = 50) -> list[Candidate]:
+        # Joueurs du jeu aux tiers demandés, classés par part de la fenêtre couverte, puis
+        # disponibles maintenant et jeu principal d'abord. Les "disponibles maintenant" couvrent l'heure en cours.
+        now = now or datetime.utcnow()
+        slots = window_slots(start, end)
+        current = slot_of(now) if start <= now < end else None
+        with self._lock:
+            by_tier = self._slots.get(game_id, {})
+            now_by_tier = self._now.get(game_id, {})
+            hits = {}
+            for tier in tiers:
+                tier_slots = by_tier.get(tier, {})
+                for slot in slots:
+                    for user_id in tier_slots.get(slot, ()):
+                        hits[user_id] = hits.get(user_id, 0) + 1
+                if current is not None:
+                    for user_id in now_by_tier.get(tier, ()):
+                        if current not in self._profiles[user_id].slots:
+                            hits[user_id] = hits.get(user_id, 0) + 1
+            hits.pop(exclude_user, None)
+            results = []
+            for user_id, count in hits.items():
+                tier, is_main_game = self._user_games[user_id][game_id]
+                results.append(Candidate(user_id, tier, is_main_game, self._profiles[user_id].available_now,
+                                         round(min(1.0, count / len(slots)), 3)))
+        results.sort(key=lambda c: (-c.coverage, not c.available_now, not c.is_main_game, c.user_id))
+        return results[:limit]
+
+    async def load(self, db: AsyncSession):
+        # Reconstruction complète (démarrage, rechargement périodique) puis échange atomique
+        fresh = AvailabilityIndex()
+        result = await db.execute(select(models.UserProfile.user_id, models.UserProfile.availability_schedule,
+                                         models.UserProfile.timezone, models.UserProfile.is_available_now))
+        now = datetime.utcnow()
+        for user_id, schedule, tz_name, available_now in result:
+            profile = fresh._profiles[user_id] = _Profile()
+            profile.schedule, profile.timezone, profile.available_now = schedule, tz_name, bool(available_now)
+            profile.slots = schedule_slots(schedule, tz_name, now)
+        result = await db.execute(select(models.UserGame.user_id, models.UserGame.game_id,
+                                         models.UserGame.skill_level, models.UserGame.is_main_game))
+        for user_id, game_id, level, is_main_game in result:
+            fresh._user_games.setdefault(user_id, {})[game_id] = (skill_tier(level), bool(is_main_game))
+        for user_id in fresh._user_games:
+            fresh._index(user_id)
+        with self._lock:
+            self._slots, self._now = fresh._slots, fresh._now
+            self._profiles, self._user_games = fresh._profiles, fresh._user_games
+        return len(self._user_games)
+
+    async def refresh_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.load(db)
+            except Exception:
+                logger.exception("Availability index refresh failed")
+
+
+availability_index = AvailabilityIndex()
+
+
+# Maintenance par les commits ORM : les changements sont relevés au flush (seules les colonnes déjà
+# chargées sont lues, pour ne jamais déclencher de SQL) et appliqués après le commit, pas avant.
+_PROFILE_FIELDS = {"availability_schedule": "schedule", "timezone": "timezone", "is_available_now": "available_now"}
+
+
+def _snapshot(obj, deleted: bool):
+    values = inspect(obj).dict
+    if isinstance(obj, models.UserProfile):
+        return ("profile", deleted, values.get("user_id"), {_PROFILE_FIELDS[k]: values[k] for k in _PROFILE_FIELDS if k in values})
+    return ("user_game", deleted, values.get("user_id"), {k: values[k] for k in ("game_id", "skill_level", "is_main_game") if k in values})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault("availability_changes", [])
+    for objects, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for obj in objects:
+            if isinstance(obj, (models.UserProfile, models.UserGame)):
+                changes.append(_snapshot(obj, deleted))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    for kind, deleted, user_id, values in session.info.pop("availability_changes", ()):
+        if user_id is None:
+            continue
+        if kind == "profile":
+            if deleted:
+                availability_index.remove_profile(user_id)
+            else:
+                availability_index.set_profile(user_id, values)
+        elif "game_id" in values:
+            if deleted:
+                availability_index.remove_user_game(user_id, values["game_id"])
+            else:
+                availability_index.set_user_game(user_id, values["game_id"],
+                                                 skill_tier(values["skill_level"]) if "skill_level" in values else None,
+                                                 values.get("is_main_game"))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("availability_changes", None)
+
+
+@collector
+def _availability_samples():
+    return (
+        metric_lines("availability_index_users", "gauge", "Players with at least one game in the availability index",
+                     [({}, len(availability_index))])
+        + metric_lines("availability_index_available_now", "gauge", "Players flagged as available now",
+                       [({}, sum(p.available_now for p in list(availability_index._profiles.values())))])
+    )
@@ -0,0 +1,64 @@
+# Benchmark : création de requêtes de match une par une vs par lots (/matchmaking/requests/batch)
+# Lancement : python -m benchmarks.bench_batch_requests [--requests 1000] [--batch-size 5 25 100]
+# Nécessite httpx ; utilise une base SQLite temporaire.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_batch.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false") # on mesure l'application, pas le limiteur
+
+import httpx
+import auth
+import models
+from database import Base, SessionLocal, engine
+from main import app
+
+REQUEST = {"game_id": 1, "request_type": "find_team", "available_from": "2030-01-01T18:00:00",
+           "available_until": "2030-01-01T22:00:00", "max_players": 5, "preferred_game_modes": ["ranked"]}
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(models.Game(id=1, name="Bench", slug="bench", category="fps"))
+        db.add(models.User(id=1, email="bench@bench.local", username="bench", password_hash="x"))
+        db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[5, 25, 100])
+    args = parser.parse_args()
+
+    seed()
+    token = auth.create_access_token({"sub": "1"})
+    headers = {"Authorization": f"Bearer {token}"}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", headers=headers) as client:
+            print(f"{'mode':>12} {'requêtes/s':>12} {'appels HTTP':>12}")
+
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                response = await client.post("/matchmaking/requests/", json=REQUEST)
+                response.raise_for_status()
+            elapsed = time.perf_counter() - start
+            print(f"{'single':>12} {args.requests / elapsed:>12.1f} {args.requests:>12}")
+
+            for size in args.batch_size:
+                calls = -(-args.requests // size)
+                start = time.perf_counter()
+                for _ in range(calls):
+                    response = await client.post("/matchmaking/requests/batch", json={"items": [REQUEST] * size})
+                    response.raise_for_status()
+                elapsed = time.perf_counter() - start
+                print(f"{f'batch x{size}':>12} {calls * size / elapsed:>12.1f} {calls:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+# Benchmark : "qui est disponible pour le jeu X au tier Y dans la fenêtre Z ?"
+# Index en mémoire (availability.py) vs lecture SQL des UserGame + JSON de disponibilités filtrés en Python.
+# Lancement : python -m benchmarks.bench_candidates [--users 20000] [--games 20] [--queries 200]
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_candidates.db")
+
+from sqlalchemy import insert, select
+from availability import AvailabilityIndex, schedule_slots, window_slots
+from database import AsyncSessionLocal, Base, SessionLocal, engine
+from scoring import SKILL_TIERS
+import models
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+TIMEZONES = ["Europe/Paris", "Europe/Moscow", "America/New_York", "Asia/Tokyo", None]
+
+
+def seed(users: int, games: int, rng: random.Random):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(models.Game), [{"id": i, "name": f"Game {i}", "slug": f"game-{i}"} for i in range(1, games + 1)])
+        db.execute(insert(models.User), [{"id": i, "email": f"p{i}@example.com", "username": f"p{i}", "password_hash": "x"}
+                                         for i in range(1, users + 1)])
+        db.execute(insert(models.UserProfile), [
+            {"user_id": i, "timezone": rng.choice(TIMEZONES), "is_available_now": rng.random() < 0.05,
+             "availability_schedule": {day: [f"{h}:00-{h + rng.randint(1, 5)}:00"]
+                                       for day in rng.sample(DAYS, 3) for h in [rng.randint(8, 19)]}}
+            for i in range(1, users + 1)])
+        db.execute(insert(models.UserGame), [
+            {"user_id": i, "game_id": game_id, "skill_level": rng.choice(SKILL_TIERS), "is_main_game": n == 0}
+            for i in range(1, users + 1) for n, game_id in enumerate(rng.sample(range(1, games + 1), 3))])
+        db.commit()
+
+
+async def sql_scan(game_id: int, tiers: list, start: datetime, end: datetime, limit: int):
+    # Ce qu'il faudrait faire sans index : tous les joueurs du jeu, JSON décodé et évalué à chaque appel
+    slots = window_slots(start, end)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.UserGame.user_id, models.UserGame.skill_level, models.UserProfile.availability_schedule,
+                   models.UserProfile.timezone)
+            .join(models.UserProfile, models.UserProfile.user_id == models.UserGame.user_id)
+            .where(models.UserGame.game_id == game_id, models.UserGame.skill_level.in_([SKILL_TIERS[t] for t in tiers]))
+        )
+        hits = []
+        for user_id, level, schedule, tz_name in result:
+            covered = len(schedule_slots(schedule, tz_name) & set(slots))
+            if covered:
+                hits.append((-covered, user_id))
+    return sorted(hits)[:limit]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    seed(args.users, args.games, rng)
+    index = AvailabilityIndex()
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        await index.load(db)
+    print(f"index construit en {time.perf_counter() - start:.2f} s ({args.users} joueurs, {args.users * 3} UserGame)")
+
+    queries = []
+    for _ in range(args.queries):
+        tier = rng.randrange(len(SKILL_TIERS))
+        begin = datetime(2030, 1, 7) + timedelta(hours=rng.randrange(168))
+        queries.append((rng.randint(1, args.games), [t for t in (tier - 1, tier, tier + 1) if 0 <= t < len(SKILL_TIERS)],
+                        begin, begin + timedelta(hours=rng.randint(1, 4))))
+
+    async def index_query(game_id, tiers, start, end):
+        return index.candidates(game_id, tiers, start, end, limit=50)
+
+    timings = {}
+    for label, run in (("index", lambda q: index_query(*q)), ("SQL + JSON", lambda q: sql_scan(*q, limit=50))):
+        values = []
+        for query in queries:
+            begin = time.perf_counter()
+            await run(query)
+            values.append(time.perf_counter() - begin)
+        values.sort()
+        timings[label] = values
+    print(f"{'méthode':<12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for label, values in timings.items():
+        print(f"{label:<12} {values[len(values) // 2] * 1e3:>8.3f} {values[int(len(values) * 0.95)] * 1e3:>8.3f} {values[-1] * 1e3:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+# Benchmark : surcoût des mesures par requête (middleware de métriques devant une application
+# ASGI vide) et coût du rendu de /metrics avec beaucoup de routes.
+# Lancement : python -m benchmarks.bench_instrumentation [--requests 200000] [--routes 50]
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite" # aucune requête SQL ici, mais instrumentation importe la configuration BD
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_instrumentation.db")
+
+from instrumentation import RequestMetrics, RequestMetricsMiddleware
+from metrics import render_metrics
+import instrumentation
+
+
+class Route:
+    def __init__(self, path: str):
+        self.path = path
+
+
+def make_app(routes: list):
+    async def app(scope, receive, send):
+        scope["route"] = routes[scope["i"] % len(routes)] # ce que fait le routeur FastAPI
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+async def drive(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(count):
+        await app({"type": "http", "method": "GET", "path": "/", "headers": [], "i": i}, receive, send)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--routes", type=int, default=50)
+    args = parser.parse_args()
+
+    routes = [Route(f"/route/{i}/{{item_id}}") for i in range(args.routes)]
+    app = make_app(routes)
+    metrics = RequestMetrics()
+    baseline = await drive(app, args.requests)
+    measured = await drive(RequestMetricsMiddleware(app, metrics), args.requests)
+    overhead = (measured - baseline) / args.requests * 1e6
+    print(f"sans mesures      {baseline / args.requests * 1e6:>7.2f} µs/requête")
+    print(f"avec mesures      {measured / args.requests * 1e6:>7.2f} µs/requête  (surcoût {overhead:.2f} µs)")
+
+    instrumentation.request_metrics = metrics # le collecteur lit l'instance du module
+    start = time.perf_counter()
+    body = render_metrics()
+    print(f"rendu /metrics    {(time.perf_counter() - start) * 1e3:>7.2f} ms  ({len(body.splitlines())} lignes, {args.routes} routes)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
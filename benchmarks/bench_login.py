@@ -0,0 +1,101 @@
+# Benchmark : tempête de logins, bcrypt dans la boucle (inline) vs pool borné
+# Lancement : python -m benchmarks.bench_login [--logins 200] [--concurrency 50]
+# Nécessite httpx ; utilise une base SQLite temporaire.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false") # on mesure l'application, pas le limiteur
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+
+import httpx
+import auth
+import models
+from database import SessionLocal
+from main import app
+
+PASSWORD = "password123"
+
+
+async def _inline_verify(plain_password, hashed_password):
+    # Ancien comportement : bcrypt exécuté directement dans la boucle d'événements
+    return auth.verify_password(plain_password, hashed_password)
+
+
+def seed(users: int):
+    password_hash = auth.get_password_hash(PASSWORD)
+    with SessionLocal() as db:
+        if db.query(models.User).count():
+            return
+        db.add_all(models.User(email=f"user{i}@bench.local", username=f"user{i}", password_hash=password_hash)
+                   for i in range(users))
+        db.commit()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1e3 if values else 0.0
+
+
+async def run(mode: str, logins: int, concurrency: int, users: int):
+    auth.password_hasher.shutdown()
+    original_verify = auth.PasswordHasher.verify
+    if mode == "inline":
+        auth.password_hasher.verify = _inline_verify
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        login_latencies, probe_latencies, statuses = [], [], {}
+        done = asyncio.Event()
+
+        async def login(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/users/login", json={"username_or_email": f"user{i % users}", "password": PASSWORD})
+                login_latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            # Requête légère en parallèle : mesure la famine de la boucle d'événements
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    if mode == "inline":
+        del auth.password_hasher.verify
+    auth.PasswordHasher.verify = original_verify
+    print(f"{mode:>7} {logins / elapsed:>10.1f} {percentile(login_latencies, 0.5):>10.1f} {percentile(login_latencies, 0.99):>10.1f}"
+          f" {len(probe_latencies):>8} {percentile(probe_latencies, 0.99):>12.1f} {max(probe_latencies) * 1e3:>12.1f}   {statuses}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    async with app.router.lifespan_context(app):
+        seed(args.users)
+        print(f"{'mode':>7} {'logins/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'GET /':>8} {'GET / p99':>12} {'GET / max':>12}   statuts")
+        for mode in ("inline", "pool"):
+            await run(mode, args.logins, args.concurrency, args.users)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+# Benchmark : coût du limiteur de débit par requête (seau en mémoire, clé IP, plus utilisateur si authentifié)
+# et surcoût du middleware devant une application ASGI vide.
+# Lancement : python -m benchmarks.bench_rate_limit [--requests 100000] [--clients 10000]
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite" # aucune requête SQL ici, mais auth importe la configuration BD
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_rate_limit.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from auth import create_access_token
+from ratelimit import InMemoryBucketStore, RateLimiter, RateLimitMiddleware, parse_limits
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def scopes(count: int, clients: int, tokens: bool):
+    headers = [[(b"authorization", f"Bearer {create_access_token({'sub': str(i)})}".encode())] for i in range(clients)]
+    for i in range(count):
+        yield {"type": "http", "method": "POST", "path": "/matchmaking/requests/",
+               "headers": headers[i % clients] if tokens else [], "client": (f"10.0.{i % clients // 256}.{i % 256}", 5000)}
+
+
+async def drive(app, requests: list) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for scope in requests:
+        await app(scope, receive, send)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--store-size", type=int, default=5_000, help="plus petit que --clients pour exercer l'éviction")
+    args = parser.parse_args()
+
+    # Limite haute : on mesure le chemin "requête acceptée", le plus fréquent
+    limits = "POST /matchmaking/requests/=1000000/1"
+    baseline = await drive(empty_app, list(scopes(args.requests, args.clients, tokens=False)))
+    print(f"{'scénario':<28} {'µs/requête':>11} {'surcoût':>9} {'seaux':>7}")
+    print(f"{'sans limiteur':<28} {baseline / args.requests * 1e6:>11.2f} {'':>9} {'':>7}")
+    for label, tokens in (("clé IP", False), ("clés IP + utilisateur (JWT)", True)):
+        store = InMemoryBucketStore(args.store_size)
+        app = RateLimitMiddleware(empty_app, RateLimiter(parse_limits(limits), store))
+        requests = list(scopes(args.requests, args.clients, tokens))
+        await drive(app, requests[: args.clients]) # préchauffe le cache des jetons
+        elapsed = await drive(app, requests)
+        overhead = (elapsed - baseline) / args.requests * 1e6
+        print(f"{label:<28} {elapsed / args.requests * 1e6:>11.2f} {overhead:>7.2f}µs {len(store):>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
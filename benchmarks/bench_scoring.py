@@ -0,0 +1,56 @@
+# Benchmark : scoring vectorisé (NumPy) vs scoring Python couple par couple
+# Lancement : python -m benchmarks.bench_scoring [--sizes 1000 10000 100000]
+import argparse
+import random
+import time
+from scoring import Features, CandidateBatch, score_batch, score_pair, SKILL_TIERS, encode_tags, encode_tiers
+
+MODES = ["ranked", "casual", "competitive", "arena", "duo", "squad", "custom"]
+ROLES = ["tank", "support", "dps", "jungle", "mid", "carry"]
+PLAYTIME = ["morning", "afternoon", "evening", "night", "weekend"]
+
+
+def random_features(rng: random.Random) -> Features:
+    start = 1_700_000_000 + rng.randint(0, 86_400)
+    return Features(
+        tier=rng.randrange(len(SKILL_TIERS)),
+        tier_mask=encode_tiers(rng.sample(SKILL_TIERS, rng.randint(0, 3))),
+        modes=encode_tags(rng.sample(MODES, rng.randint(0, 3))),
+        roles=encode_tags(rng.sample(ROLES, rng.randint(0, 2))),
+        playtime=encode_tags(rng.sample(PLAYTIME, rng.randint(0, 2))),
+        level=rng.randint(-1, 3),
+        start=start,
+        end=start + rng.randint(1_800, 14_400),
+    )
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    query = random_features(rng)
+    print(f"{'candidats':>10} {'python (ms)':>12} {'encodage (ms)':>14} {'numpy (ms)':>11} {'gain':>7}")
+    for size in args.sizes:
+        candidates = [random_features(rng) for _ in range(size)]
+        naive, expected = best_of(lambda: [score_pair(query, c) for c in candidates], args.repeat)
+        encode, batch = best_of(lambda: CandidateBatch(candidates), args.repeat)
+        vector, scores = best_of(lambda: score_batch(query, batch), args.repeat)
+        mismatches = sum(abs(a - b) > 0.011 for a, b in zip(expected, scores.tolist()))
+        assert not mismatches, f"{mismatches} scores divergents"
+        print(f"{size:>10} {naive * 1e3:>12.2f} {encode * 1e3:>14.2f} {vector * 1e3:>11.2f} {naive / vector:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
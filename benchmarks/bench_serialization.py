@@ -0,0 +1,75 @@
+# Benchmark : liste de matches, chemin par défaut (entités ORM -> Pydantic -> json) vs
+# chemin rapide (tuples projetés -> orjson), lecture SQL comprise.
+# Lancement : python -m benchmarks.bench_serialization [--sizes 10 100 1000 10000]
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_serialization.db")
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from database import Base, SessionLocal, engine
+from serialization import dumps, projection
+import models, schemas
+
+MATCHES = TypeAdapter(list[schemas.Match])
+
+
+def seed(count: int):
+    Base.metadata.create_all(bind=engine)
+    now = datetime(2030, 1, 1)
+    with SessionLocal() as db:
+        db.add(models.Game(id=1, name="Bench", slug="bench", category="fps"))
+        db.add(models.User(id=1, email="bench@bench.local", username="bench", password_hash="x"))
+        db.add(models.MatchRequest(id=1, user_id=1, game_id=1, request_type="quick_match", available_from=now, available_until=now))
+        db.add_all(models.Match(match_request_id=1, matched_user_id=1, game_id=1, compatibility_score=0.75,
+                                suggested_game_mode="ranked", suggested_role="support", expires_at=now + timedelta(minutes=i))
+                   for i in range(count))
+        db.commit()
+
+
+def default_path(db, limit: int) -> bytes:
+    # Ce que fait FastAPI avec response_model : validation from_attributes, dump en mode JSON, json.dumps
+    matches = db.execute(select(models.Match).limit(limit)).scalars().all()
+    content = MATCHES.dump_python(MATCHES.validate_python(matches, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_path(db, limit: int) -> bytes:
+    rows = db.execute(select(*projection(models.Match, schemas.Match)).limit(limit)).all()
+    return dumps([row._asdict() for row in rows])
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            fn(db)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    seed(max(args.sizes))
+    with SessionLocal() as db:
+        assert json.loads(default_path(db, 50)) == json.loads(fast_path(db, 50)), "les deux chemins doivent produire le même JSON"
+    print(f"{'matches':>8} {'défaut (ms)':>12} {'rapide (ms)':>12} {'gain':>7}")
+    for size in args.sizes:
+        default = best_of(lambda db: default_path(db, size), args.repeat)
+        fast = best_of(lambda db: fast_path(db, size), args.repeat)
+        print(f"{size:>8} {default * 1e3:>12.2f} {fast * 1e3:>12.2f} {default / fast:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
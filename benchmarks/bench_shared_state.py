@@ -0,0 +1,66 @@
+# Benchmark : coût de l'état partagé entre workers (SQLite WAL) face à la version en mémoire.
+# Deux instances ouvertes sur le même fichier jouent le rôle de deux workers : débit des
+# seaux du limiteur et délai de propagation d'un message publié par l'un, reçu par l'autre.
+# Lancement : python -m benchmarks.bench_shared_state [--takes 5000] [--messages 200]
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite" # aucune requête SQL ici, mais ratelimit importe la configuration BD
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_shared_state.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from config import settings
+from ratelimit import InMemoryBucketStore, Limit, SharedBucketStore
+from shared_state import SQLiteSharedState
+
+
+async def bucket_rate(store, takes: int, clients: int = 1000) -> float:
+    limit = Limit(1000, 1.0)
+    start = time.perf_counter()
+    for i in range(takes):
+        await store.take(f"ip:10.0.0.{i % clients}", limit)
+    return takes / (time.perf_counter() - start)
+
+
+async def propagation(sender: SQLiteSharedState, receiver: SQLiteSharedState, messages: int) -> list[float]:
+    delays, received = [], asyncio.Event()
+
+    def on_message(message):
+        delays.append(time.perf_counter() - message["sent"])
+        received.set()
+    receiver.subscribe("bench", on_message)
+    for _ in range(messages):
+        received.clear()
+        await sender.publish("bench", {"sent": time.perf_counter()})
+        await asyncio.wait_for(received.wait(), timeout=5)
+    return delays
+
+
+async def main(takes: int, messages: int):
+    path = os.path.join(tempfile.mkdtemp(), "shared_state.db")
+    first = SQLiteSharedState(path, settings.SHARED_STATE_POLL_SECONDS)
+    second = SQLiteSharedState(path, settings.SHARED_STATE_POLL_SECONDS)
+    await first.start()
+    await second.start()
+    try:
+        memory = await bucket_rate(InMemoryBucketStore(10_000), takes)
+        shared = await bucket_rate(SharedBucketStore(first), takes)
+        print(f"rate limit buckets: memory {memory:,.0f}/s   sqlite shared {shared:,.0f}/s ({1e6 / shared:.0f} us per take)")
+        delays = sorted(await propagation(first, second, messages))
+        print(f"publish -> other worker ({messages} messages, poll {settings.SHARED_STATE_POLL_SECONDS * 1000:.0f} ms): "
+              f"p50 {statistics.median(delays) * 1000:.1f} ms   p99 {delays[int(len(delays) * 0.99) - 1] * 1000:.1f} ms")
+    finally:
+        await first.close()
+        await second.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--takes", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.takes, args.messages))
@@ -0,0 +1,61 @@
+# Benchmark : vérifications de jeton par seconde, vérification classique (utilisateur relu en BD ou
+# dans le cache) vs mode sans BD (claims du jeton + table de révocation en mémoire).
+# Lancement : python -m benchmarks.bench_token_verification [--users 1000] [--verifications 20000]
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_tokens.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import insert
+import auth
+import models
+from config import settings
+from database import AsyncSessionLocal, Base, SessionLocal, engine
+
+
+def seed(users: int) -> list[str]:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(models.User), [{"id": i, "email": f"p{i}@example.com", "username": f"p{i}", "password_hash": "x",
+                                          "is_active": True, "is_banned": False} for i in range(1, users + 1)])
+        db.commit()
+        rows = db.query(models.User).all()
+    return [auth.create_access_token(auth.token_claims(user)) for user in rows]
+
+
+async def run(label: str, verify, tokens: list, count: int, before=None):
+    async with AsyncSessionLocal() as db:
+        for token in tokens[:100]: # préchauffage
+            await verify(token, db)
+        start = time.perf_counter()
+        for i in range(count):
+            if before is not None:
+                before()
+            await verify(tokens[i % len(tokens)], db)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<40} {count / elapsed:>12,.0f} {elapsed / count * 1e6:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--verifications", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tokens = seed(args.users)
+    print(f"{'mode':<40} {'vérifs/s':>12} {'µs/vérif':>10}")
+    settings.AUTH_STATELESS = False
+    await run("classique, cache utilisateur froid (BD)", auth.authenticate_token, tokens, args.verifications // 4, auth.user_cache.clear)
+    await run("classique, cache utilisateur chaud", auth.authenticate_token, tokens, args.verifications)
+    settings.AUTH_STATELESS = True
+    await run("sans BD, HMAC à chaque vérification", auth.authenticate_principal, tokens, args.verifications, auth.token_cache.clear)
+    await run("sans BD, jeton déjà vérifié (cache)", auth.authenticate_principal, tokens, args.verifications)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
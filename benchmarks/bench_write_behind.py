@@ -0,0 +1,75 @@
+# Benchmark : heartbeats de présence, une écriture + commit par requête (ancien schéma)
+# vs tampon d'écritures différées (regroupement par joueur, UPDATE ... CASE par lots).
+# Lancement : python -m benchmarks.bench_write_behind [--beats 5000] [--users 1000] [--concurrency 50]
+# Utilise une base SQLite temporaire.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_write_behind.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import update
+import models
+from config import settings
+from database import AsyncSessionLocal, Base, SessionLocal, count_statements, engine
+from write_behind import WriteBehindBuffer
+
+
+def seed(users: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all(models.User(id=i, email=f"user{i}@example.com", username=f"user{i}", password_hash="x") for i in range(1, users + 1))
+        db.add_all(models.UserProfile(user_id=i) for i in range(1, users + 1))
+        db.commit()
+
+
+async def naive_beat(user_id: int, available: bool):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(models.UserProfile).where(models.UserProfile.user_id == user_id)
+                         .values(is_available_now=available))
+        await db.commit()
+
+
+async def run(mode: str, beats: int, users: int, concurrency: int):
+    buffer = WriteBehindBuffer(settings.WRITE_BEHIND_FLUSH_SECONDS, settings.WRITE_BEHIND_MAX_PENDING, settings.WRITE_BEHIND_BATCH_SIZE)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def beat(i):
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "naive":
+                await naive_beat(i % users + 1, i % 2 == 0)
+            else:
+                buffer.set(models.UserProfile.is_available_now, models.UserProfile.user_id, i % users + 1, i % 2 == 0)
+            latencies.append(time.perf_counter() - start)
+
+    with count_statements() as stats:
+        start = time.perf_counter()
+        await asyncio.gather(*(beat(i) for i in range(beats)))
+        flush_start = time.perf_counter()
+        rows = await buffer.flush()
+        end = time.perf_counter()
+    latencies.sort()
+    print(f"{mode:<12} {beats / (end - start):>10,.0f} beats/s   p50 {latencies[len(latencies) // 2] * 1e6:>8.1f} us   "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:>8.1f} us   {stats.count:>5} statements"
+          + (f"   (flush {rows} rows in {(end - flush_start) * 1e3:.1f} ms)" if mode != "naive" else ""))
+
+
+async def main(beats: int, users: int, concurrency: int):
+    seed(users)
+    for mode in ("naive", "write-behind"):
+        await run(mode, beats, users, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--beats", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.beats, args.users, args.concurrency))
@@ -0,0 +1,100 @@
+# Vérifie que les requêtes fréquentes utilisent un index (EXPLAIN QUERY PLAN sur une base SQLite peuplée).
+# Lancement : python -m benchmarks.check_query_plans  (code de sortie 1 en cas de régression)
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "query_plans.db")
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from database import Base, engine, SessionLocal
+from pagination import encode_cursor
+from api.matchmaking import my_matches_query, my_requests_query
+from api.profiles import my_profile_query
+from matchmaker import active_requests_query, inserted_matches_query, player_context_query
+from sweeper import MATCH_EXPIRY, REQUEST_EXPIRY, expiring_query
+import auth, models
+
+NOW = datetime(2030, 1, 1, 12, 0, 0)
+
+
+def seed(users=500, games=20, requests_per_user=10):
+    rng = random.Random(1)
+    with SessionLocal() as db:
+        db.add_all(models.Game(id=i, name=f"Game {i}", slug=f"game-{i}", category="fps") for i in range(1, games + 1))
+        db.add_all(models.User(id=i, email=f"u{i}@plans.local", username=f"u{i}", password_hash="x") for i in range(1, users + 1))
+        db.flush()
+        db.add_all(models.UserProfile(user_id=i) for i in range(1, users + 1))
+        db.add_all(models.UserGame(user_id=i, game_id=g) for i in range(1, users + 1) for g in rng.sample(range(1, games + 1), 3))
+        request_id = 0
+        for i in range(1, users + 1):
+            for _ in range(requests_per_user):
+                request_id += 1
+                start = NOW + timedelta(minutes=rng.randint(-600, 600))
+                db.add(models.MatchRequest(id=request_id, user_id=i, game_id=rng.randint(1, games), request_type="quick_match",
+                                           available_from=start, available_until=start + timedelta(hours=2),
+                                           status=rng.choice(["active", "matched", "expired"])))
+                db.add(models.Match(match_request_id=request_id, matched_user_id=rng.randint(1, users), game_id=1,
+                                    expires_at=start, status=rng.choice(list(models.MatchStatusEnum))))
+        db.commit()
+        db.execute(text("ANALYZE"))
+
+
+def hot_queries():
+    # Requêtes construites par les mêmes fonctions que les routes, le matchmaker et le balayeur :
+    # une modification de requête ou d'index dans l'application est vérifiée ici telle quelle.
+    cursor = encode_cursor(NOW, 10_000)
+    return [
+        # (nom, requête, index attendu)
+        ("login by username/email", auth.login_query("u1"), None),
+        ("current user by id", auth.current_user_query(1), None),
+        ("profile by user_id (/profiles/me)", my_profile_query(1), "ix_user_profiles_user_id"),
+        ("player tier for a game", player_context_query(1, 2), None),
+        ("matchmaking pool bootstrap", active_requests_query(NOW), "ix_match_requests_status_until"),
+        ("my match requests, keyset page", my_requests_query(1, cursor, 50), "ix_match_requests_user_created"),
+        ("my matches, keyset page", my_matches_query(1, cursor, 50), "ix_matches_matched_user_created"),
+        ("new matches re-read", inserted_matches_query([(1, 2), (3, 4)]), "ix_matches_matched_user_status"),
+        ("expired pending matches", expiring_query(MATCH_EXPIRY, NOW, 500), "ix_matches_status_expires"),
+        ("stale active requests", expiring_query(REQUEST_EXPIRY, NOW, 500), "ix_match_requests_status_until"),
+    ]
+
+
+def query_plan(connection, query) -> list[str]:
+    sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def check(plan: list[str], expected_index: str | None) -> str | None:
+    for step in plan:
+        # "SCAN t" = parcours complet ; "SCAN t USING INDEX" = parcours complet d'un index, pas mieux
+        if step.startswith("SCAN ") and "CONSTANT ROW" not in step:
+            return f"full scan: {step}"
+    if expected_index and not any(expected_index in step for step in plan):
+        return f"expected index {expected_index}"
+    return None
+
+
+def main() -> int:
+    Base.metadata.create_all(bind=engine)
+    seed()
+    failures = 0
+    with engine.connect() as connection:
+        for name, query, expected_index in hot_queries():
+            plan = query_plan(connection, query)
+            error = check(plan, expected_index)
+            failures += error is not None
+            print(f"{'FAIL' if error else 'ok':>4}  {name}")
+            for step in plan:
+                print(f"        {step}")
+            if error:
+                print(f"        -> {error}")
+    print(f"\n{failures} regression(s)" if failures else "\nall hot queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# Garde-fou N+1 : chaque endpoint doit rester sous un nombre maximal de requêtes SQL.
+# Lancement : python -m benchmarks.check_statement_counts  (code de sortie 1 si un budget est dépassé)
+# Nécessite httpx ; utilise une base SQLite temporaire.
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "statement_counts.db")
+os.environ.setdefault("SECRET_KEY", "check-secret")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false") # on mesure l'application, pas le limiteur
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+import auth
+import models
+from database import Base, SessionLocal, count_statements, engine
+from main import app
+
+REQUEST = {"game_id": 1, "request_type": "quick_match", "available_from": "2030-01-01T18:00:00",
+           "available_until": "2030-01-01T22:00:00", "max_players": 2}
+
+# (méthode, chemin, corps, utilisateur, budget de requêtes SQL)
+# Cache utilisateur froid au premier appel authentifié de chaque utilisateur, chaud ensuite.
+CASES = [
+    ("POST", "/users/login", {"username_or_email": "player1", "password": "password"}, None, 1),
+    ("GET", "/users/me", None, 1, 1),
+    ("GET", "/users/me", None, 1, 0),
+    ("PUT", "/profiles/me", {"bio": "hello", "skill_level": "advanced"}, 1, 3),
+    ("GET", "/profiles/me", None, 1, 1),
+    ("POST", "/profiles/me/heartbeat", {"is_available_now": True}, 1, 0),
+    ("GET", "/games/", None, None, 0),
+    ("GET", "/games/1", None, None, 0),
+    ("POST", "/matchmaking/requests/", REQUEST, 1, 3),
+    ("POST", "/matchmaking/requests/", REQUEST, 2, 7),
+    ("POST", "/matchmaking/requests/batch", {"items": [REQUEST] * 10}, 1, 2),
+    ("GET", "/matchmaking/requests/me", None, 1, 1),
+    ("GET", "/matchmaking/matches/me", None, 1, 1),
+    ("GET", "/matchmaking/candidates?game_id=1", None, 1, 0),
+]
+
+
+@contextmanager
+def assert_max_statements(limit: int, label: str = ""):
+    # Échoue si le bloc émet plus de `limit` requêtes (N+1...)
+    with count_statements() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f"{label or 'block'} issued {stats.count} SQL statements (limit {limit})")
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    password_hash = auth.get_password_hash("password")
+    with SessionLocal() as db:
+        db.add(models.Game(id=1, name="Check", slug="check", category="fps"))
+        db.add_all(models.User(id=i, email=f"player{i}@example.com", username=f"player{i}", password_hash=password_hash)
+                   for i in (1, 2))
+        db.commit()
+
+
+async def main() -> int:
+    seed()
+    failures = 0
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+            for method, path, body, user_id, budget in CASES:
+                headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': str(user_id)})}"} if user_id else {}
+                try:
+                    with assert_max_statements(budget, f"{method} {path}") as stats:
+                        response = await client.request(method, path, json=body, headers=headers)
+                    error = None if response.status_code < 400 else f"HTTP {response.status_code}"
+                except AssertionError as exc:
+                    error = str(exc)
+                failures += error is not None
+                print(f"{'FAIL' if error else 'ok':>4}  {method:<5} {path:<32} {stats.count:>2} / {budget} statements"
+                      + (f"  -> {error}" if error else ""))
+    print(f"\n{failures} endpoint(s) over budget" if failures else "\nall endpoints within their SQL budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,280 @@
+# Banc de charge de l'API complète : base SQLite peuplée (utilisateurs, jeux, UserGame, requêtes,
+# matches), trafic simulé en mémoire via l'interface ASGI (httpx.ASGITransport), percentiles par
+# endpoint et résultats en JSON pour comparer deux commits.
+# Lancement : python -m benchmarks.harness [--scenarios mixed catalog] [--ops 2000] [--output out.json]
+#             python -m benchmarks.harness --compare avant.json apres.json
+# Nécessite httpx.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "harness.db")
+os.environ.setdefault("SECRET_KEY", "harness-secret")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false") # on mesure l'application, pas le limiteur
+os.environ.setdefault("BCRYPT_ROUNDS", "10") # coût réel en production : BCRYPT_ROUNDS=12
+
+import httpx
+from sqlalchemy import insert
+import auth
+import instrumentation
+import models
+from database import Base, SessionLocal, engine
+from main import app
+
+PASSWORD = "harness-password"
+GAME_MODES = ["ranked", "casual", "arena", "coop", "tournament"]
+ROLES = ["tank", "support", "dps", "flex", "igl"]
+TIERS = [level.value for level in models.UserGameSkillLevelEnum]
+REQUEST_TYPES = [kind.value for kind in models.RequestTypeEnum]
+
+# Mélanges de trafic : opération -> poids
+SCENARIOS = {
+    "login_storm": {"login": 1},
+    "catalog": {"games_list": 6, "game_detail": 3, "game_slug": 1},
+    "match_burst": {"create_request": 1},
+    "match_polling": {"matches_me": 3, "requests_me": 1},
+    "mixed": {"login": 1, "games_list": 20, "game_detail": 10, "users_me": 10, "profile_me": 5,
+              "create_request": 5, "matches_me": 30, "requests_me": 10},
+}
+
+
+class World:
+    # Ce que les utilisateurs simulés savent de la base peuplée
+    def __init__(self, users: int, games: int, user_games: dict, slugs: list):
+        self.users = users
+        self.games = games
+        self.user_games = user_games
+        self.slugs = slugs
+        self.tokens = {}
+
+    def token(self, user_id: int) -> dict:
+        headers = self.tokens.get(user_id)
+        if headers is None:
+            headers = self.tokens[user_id] = {"Authorization": f"Bearer {auth.create_access_token({'sub': str(user_id)})}"}
+        return headers
+
+
+def window(rng: random.Random, now: datetime):
+    start = now + timedelta(hours=rng.randint(1, 24 * 7))
+    return start, start + timedelta(hours=rng.randint(1, 4))
+
+
+def seed(users: int, games: int, games_per_user: int, requests_per_user: int, matches: int, rng: random.Random) -> World:
+    Base.metadata.create_all(bind=engine)
+    password_hash = auth.get_password_hash(PASSWORD) # un seul hachage, partagé par tous les comptes
+    now = datetime.utcnow()
+    slugs = [f"game-{i}" for i in range(1, games + 1)]
+    user_games = {}
+    with SessionLocal() as db:
+        db.execute(insert(models.Game), [
+            {"id": i, "name": f"Game {i}", "slug": slugs[i - 1], "category": rng.choice(["fps", "moba", "rts", "sport"]),
+             "min_players": 1, "max_players": rng.choice([2, 5, 10])}
+            for i in range(1, games + 1)])
+        db.execute(insert(models.User), [
+            {"id": i, "email": f"player{i}@example.com", "username": f"player{i}", "password_hash": password_hash}
+            for i in range(1, users + 1)])
+        db.execute(insert(models.UserProfile), [
+            {"user_id": i, "skill_level": rng.choice(list(models.SkillLevelEnum)),
+             "preferred_game_modes": rng.sample(GAME_MODES, 2), "preferred_playtime": rng.sample(["morning", "evening", "night"], 1)}
+            for i in range(1, users + 1)])
+        rows = []
+        for user_id in range(1, users + 1):
+            user_games[user_id] = rng.sample(range(1, games + 1), min(games_per_user, games))
+            rows.extend({"user_id": user_id, "game_id": game_id, "skill_level": rng.choice(TIERS),
+                         "hours_played": rng.randint(0, 2000)} for game_id in user_games[user_id])
+        db.execute(insert(models.UserGame), rows)
+        rows = []
+        for user_id in range(1, users + 1):
+            for _ in range(requests_per_user):
+                start, end = window(rng, now)
+                rows.append({"user_id": user_id, "game_id": rng.choice(user_games[user_id]), "request_type": rng.choice(REQUEST_TYPES),
+                             "available_from": start, "available_until": end, "max_players": rng.choice([2, 5]),
+                             "preferred_game_modes": rng.sample(GAME_MODES, 1), "preferred_roles": rng.sample(ROLES, 1),
+                             "status": "active"})
+        db.execute(insert(models.MatchRequest), rows)
+        request_count = len(rows)
+        if request_count:
+            db.execute(insert(models.Match), [
+                {"match_request_id": rng.randint(1, request_count), "matched_user_id": rng.randint(1, users),
+                 "game_id": rng.randint(1, games), "compatibility_score": round(rng.uniform(0.5, 1.0), 2),
+                 "suggested_game_mode": rng.choice(GAME_MODES), "status": "pending", "expires_at": now + timedelta(days=1)}
+                for _ in range(matches)])
+        db.commit()
+    return World(users, games, user_games, slugs)
+
+
+# Chaque opération retourne (gabarit de route, méthode, chemin, options de la requête httpx)
+def op_login(world, rng):
+    user_id = rng.randint(1, world.users)
+    return "POST /users/login", "POST", "/users/login", {"json": {"username_or_email": f"player{user_id}", "password": PASSWORD}}
+
+
+def op_games_list(world, rng):
+    return "GET /games/", "GET", "/games/", {}
+
+
+def op_game_detail(world, rng):
+    return "GET /games/{game_id}", "GET", f"/games/{rng.randint(1, world.games)}", {}
+
+
+def op_game_slug(world, rng):
+    return "GET /games/slug/{slug}", "GET", f"/games/slug/{rng.choice(world.slugs)}", {}
+
+
+def op_users_me(world, rng):
+    return "GET /users/me", "GET", "/users/me", {"headers": world.token(rng.randint(1, world.users))}
+
+
+def op_profile_me(world, rng):
+    return "GET /profiles/me", "GET", "/profiles/me", {"headers": world.token(rng.randint(1, world.users))}
+
+
+def op_create_request(world, rng):
+    user_id = rng.randint(1, world.users)
+    start, end = window(rng, datetime.utcnow())
+    body = {"game_id": rng.choice(world.user_games[user_id]), "request_type": rng.choice(REQUEST_TYPES),
+            "available_from": start.isoformat(), "available_until": end.isoformat(), "max_players": rng.choice([2, 5]),
+            "preferred_game_modes": rng.sample(GAME_MODES, 1), "preferred_roles": rng.sample(ROLES, 1)}
+    return "POST /matchmaking/requests/", "POST", "/matchmaking/requests/", {"json": body, "headers": world.token(user_id)}
+
+
+def op_matches_me(world, rng):
+    return "GET /matchmaking/matches/me", "GET", "/matchmaking/matches/me", {"headers": world.token(rng.randint(1, world.users))}
+
+
+def op_requests_me(world, rng):
+    return "GET /matchmaking/requests/me", "GET", "/matchmaking/requests/me", {"headers": world.token(rng.randint(1, world.users))}
+
+
+OPERATIONS = {name[3:]: fn for name, fn in globals().items() if name.startswith("op_")}
+
+
+def percentile(values: list, q: float) -> float:
+    # values triées ; rang le plus proche
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+async def run_scenario(client: httpx.AsyncClient, world: World, mix: dict, ops: int, concurrency: int, rng: random.Random) -> dict:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = [OPERATIONS[name](world, rng) for name in rng.choices(names, weights, k=ops)]
+    latencies, statuses = {}, {}
+
+    async def worker(offset: int):
+        for label, method, path, options in plan[offset::concurrency]:
+            start = time.perf_counter()
+            response = await client.request(method, path, **options)
+            latencies.setdefault(label, []).append(time.perf_counter() - start)
+            statuses.setdefault(label, {}).setdefault(str(response.status_code), 0)
+            statuses[label][str(response.status_code)] += 1
+
+    instrumentation.request_metrics.routes.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    sql = {f"{method} {route}": stats.statements for (method, route), stats in instrumentation.request_metrics.routes.items()}
+    endpoints = {}
+    for label, values in sorted(latencies.items()):
+        values.sort()
+        histogram = sql.get(label)
+        endpoints[label] = {
+            "count": len(values),
+            "throughput": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 0.50) * 1e3, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1e3, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1e3, 3),
+            "max_ms": round(values[-1] * 1e3, 3),
+            "statuses": statuses[label],
+            "sql_per_request": round(histogram.sum / histogram.count, 2) if histogram and histogram.count else None,
+        }
+    return {"ops": ops, "concurrency": concurrency, "seconds": round(elapsed, 3), "throughput": round(ops / elapsed, 1), "endpoints": endpoints}
+
+
+def print_scenario(name: str, result: dict):
+    print(f"\n== {name}: {result['ops']} requêtes en {result['seconds']} s ({result['throughput']} req/s, concurrence {result['concurrency']})")
+    print(f"{'endpoint':<34} {'n':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8}  statuts")
+    for label, row in result["endpoints"].items():
+        sql = "-" if row["sql_per_request"] is None else row["sql_per_request"]
+        print(f"{label:<34} {row['count']:>6} {row['throughput']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {sql:>8}  {row['statuses']}")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"avant : {before['commit']} ({before['started_at']})\naprès : {after['commit']} ({after['started_at']})")
+    for name, scenario in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+        print(f"\n== {name}: {old['throughput']} -> {scenario['throughput']} req/s ({scenario['throughput'] / old['throughput'] - 1:+.1%})")
+        print(f"{'endpoint':<34} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+        for label, row in scenario["endpoints"].items():
+            previous = old["endpoints"].get(label)
+            if previous is None:
+                continue
+            cells = [f"{previous[k]:>7} -> {row[k]:<7}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+            print(f"{label:<34} {' '.join(cells)}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    world = seed(args.users, args.games, args.games_per_user, args.requests_per_user, args.matches, rng)
+    print(f"base peuplée en {time.perf_counter() - start:.1f} s : {args.users} utilisateurs, {args.games} jeux, "
+          f"{args.users * min(args.games_per_user, args.games)} UserGame, {args.users * args.requests_per_user} requêtes, {args.matches} matches")
+
+    results = {"commit": git_commit(), "started_at": datetime.now().isoformat(timespec="seconds"),
+               "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}, "scenarios": {}}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://harness") as client:
+            for name in args.scenarios:
+                # bcrypt domine la connexion : moins d'opérations pour garder un temps raisonnable
+                ops = min(args.ops, args.login_ops) if name == "login_storm" else args.ops
+                await run_scenario(client, world, SCENARIOS[name], min(ops, 50), args.concurrency, rng) # préchauffage
+                results["scenarios"][name] = await run_scenario(client, world, SCENARIOS[name], ops, args.concurrency, rng)
+                print_scenario(name, results["scenarios"][name])
+
+    output = args.output or f"harness-{results['commit']}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nrésultats enregistrés dans {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--ops", type=int, default=2000, help="requêtes par scénario")
+    parser.add_argument("--login-ops", type=int, default=100, help="plafond pour login_storm (bcrypt)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--games-per-user", type=int, default=3)
+    parser.add_argument("--requests-per-user", type=int, default=2)
+    parser.add_argument("--matches", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON (défaut : harness-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="compare deux fichiers de résultats")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        asyncio.run(main(args))
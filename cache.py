@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from metrics import collector, metric_lines
+
+_caches = []
+
+
+class TTLCache:
+    # Cache LRU borné avec expiration ; compteurs hits/misses exportés sur /metrics
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        _caches.append(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None or item[0] <= time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+
+    def clear(self):
+        self._data.clear()
+
+
+@collector
+def _cache_samples():
+    return (
+        metric_lines("cache_hits_total", "counter", "Cache hits", [({"cache": c.name}, c.hits) for c in _caches])
+        + metric_lines("cache_misses_total", "counter", "Cache misses", [({"cache": c.name}, c.misses) for c in _caches])
+        + metric_lines("cache_entries", "gauge", "Entries currently cached", [({"cache": c.name}, len(c)) for c in _caches])
+    )
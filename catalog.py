@@ -0,0 +1,109 @@
+import asyncio
+import bisect
+import hashlib
+from datetime import datetime
+import logging
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+import models, schemas
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_PAGES = 128
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class CachedBody:
+    # Réponse JSON déjà sérialisée + son ETag fort
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = make_etag(body)
+
+
+class GameCatalog:
+    # Catalogue des jeux en mémoire : change rarement, lu par tous les clients au démarrage
+    def __init__(self):
+        self.version = 0
+        self._fingerprint = None
+        self._keys = [] # (created_at, id) triés : ordre de pagination
+        self._active = []
+        self._items = [] # JSON de chaque jeu, même ordre que _keys
+        self._by_id = {}
+        self._by_slug = {}
+        self._pages = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._fingerprint is not None
+
+    def __contains__(self, game_id: int) -> bool:
+        return game_id in self._by_id
+
+    async def load(self, db: AsyncSession) -> bool:
+        # Empreinte bon marché (nombre + dernière modif) : on ne recharge que si elle change
+        result = await db.execute(select(func.count(models.Game.id), func.max(models.Game.updated_at), func.max(models.Game.id)))
+        fingerprint = tuple(result.one())
+        if fingerprint == self._fingerprint:
+            return False
+        result = await db.execute(select(models.Game).order_by(models.Game.created_at, models.Game.id))
+        keys, active, items, by_id, by_slug = [], [], [], {}, {}
+        for game in result.scalars():
+            cached = CachedBody(schemas.Game.model_validate(game).model_dump_json().encode())
+            keys.append((game.created_at or datetime.min, game.id))
+            active.append(game.is_active)
+            items.append(cached.body)
+            by_id[game.id] = cached
+            by_slug[game.slug] = cached
+        self._keys, self._active, self._items = keys, active, items
+        self._by_id, self._by_slug, self._pages = by_id, by_slug, {}
+        self._fingerprint = fingerprint
+        self.version += 1
+        return True
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with AsyncSessionLocal() as db:
+                await self.load(db)
+
+    def page(self, after: tuple | None, limit: int, is_active: bool | None = None) -> tuple[CachedBody, tuple | None]:
+        # Page qui suit la clé `after` (created_at, id), en ordre croissant ; retourne aussi la clé du curseur suivant
+        key = (after, limit, is_active)
+        cached = self._pages.get(key)
+        if cached is None:
+            start = bisect.bisect_right(self._keys, after) if after else 0
+            bodies, last = [], None
+            for i in range(start, len(self._keys)):
+                if is_active is None or self._active[i] == is_active:
+                    bodies.append(self._items[i])
+                    last = self._keys[i]
+                    if len(bodies) == limit:
+                        break
+            cached = (CachedBody(b"[" + b",".join(bodies) + b"]"), last if len(bodies) == limit else None)
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = cached
+        return cached
+
+    def get(self, game_id: int) -> CachedBody | None:
+        return self._by_id.get(game_id)
+
+    def get_by_slug(self, slug: str) -> CachedBody | None:
+        return self._by_slug.get(slug)
+
+    async def refresh_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.load(db)
+            except Exception:
+                logger.exception("Game catalog refresh failed")
+
+
+catalog = GameCatalog()
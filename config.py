@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv # Убедись, что добавил python-dotenv в requirements
 
 load_dotenv()
@@ -9,8 +10,81 @@ class Settings:
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "esport_platform")
     DATABASE_USER: str = os.getenv("DATABASE_USER", "root") 
     DATABASE_PASSWORD: str = os.getenv("DATABASE_PASSWORD", "") 
+    # "mysql" en production, "sqlite" pour les tests de charge en local (sans serveur MySQL)
+    DATABASE_BACKEND: str = os.getenv("DATABASE_BACKEND", "mysql")
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "./esport_platform.db")
+    # Pool de connexions (par worker)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800")) # MySQL coupe les connexions inactives (wait_timeout)
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "") 
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Rotation des clés JWT : "kid1:secret1,kid2:secret2". On ajoute la nouvelle clé, on la rend
+    # active (JWT_ACTIVE_KID), puis on retire l'ancienne une fois ses jetons expirés.
+    # Sans JWT_KEYS, SECRET_KEY sert seule ; elle reste acceptée pour les jetons sans "kid".
+    JWT_KEYS: str = os.getenv("JWT_KEYS", "")
+    JWT_ACTIVE_KID: str = os.getenv("JWT_ACTIVE_KID", "")
+    # Vérification sans BD : les routes qui n'ont besoin que de l'id lisent les claims du jeton
+    AUTH_STATELESS: bool = os.getenv("AUTH_STATELESS", "false").lower() in ("1", "true", "yes")
+
+    # Hachage des mots de passe (bcrypt), hors de la boucle d'événements
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    HASH_EXECUTOR: str = os.getenv("HASH_EXECUTOR", "thread") # "thread" ou "process"
+    HASH_WORKERS: int = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    HASH_QUEUE_LIMIT: int = int(os.getenv("HASH_QUEUE_LIMIT", "32")) # au-delà : 503 immédiat
+
+    # Cache des utilisateurs authentifiés et des jetons déjà vérifiés
+    AUTH_CACHE_TTL: int = int(os.getenv("AUTH_CACHE_TTL", "30"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+    # Catalogue des jeux (cache en mémoire + en-têtes HTTP)
+    CATALOG_REFRESH_SECONDS: int = int(os.getenv("CATALOG_REFRESH_SECONDS", "300"))
+    CATALOG_MAX_AGE: int = int(os.getenv("CATALOG_MAX_AGE", "60"))
+
+    # Pagination des listes
+    PAGE_SIZE_DEFAULT: int = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+    PAGE_SIZE_MAX: int = int(os.getenv("PAGE_SIZE_MAX", "200"))
+    # Sérialisation orjson + lecture en tuples pour les listes (opt-in)
+    FAST_JSON: bool = os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+    # Expiration en tâche de fond des matches et requêtes périmés
+    SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SWEEP_INTERVAL_SECONDS", "60"))
+    SWEEP_BATCH_SIZE: int = int(os.getenv("SWEEP_BATCH_SIZE", "500"))
+    SWEEP_MAX_BATCHES: int = int(os.getenv("SWEEP_MAX_BATCHES", "20")) # par table et par passage, pour borner sa durée
+
+    # Notifications temps réel (WebSocket / SSE)
+    NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", "100")) # messages en attente par connexion
+    NOTIFY_KEEPALIVE_SECONDS: float = float(os.getenv("NOTIFY_KEEPALIVE_SECONDS", "15"))
+
+    # Limitation de débit (seaux à jetons par utilisateur authentifié, sinon par IP).
+    # Format : "MÉTHODE /chemin=requêtes/secondes;..." ; "off" exempte une route, "*" s'applique aux autres.
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMITS: str = os.getenv("RATE_LIMITS", "POST /users/login=10/60;POST /users/register=5/60;"
+                                 "POST /matchmaking/requests/=30/60;POST /matchmaking/requests/batch=10/60;GET /metrics=off;*=300/60")
+    RATE_LIMIT_STORE_SIZE: int = int(os.getenv("RATE_LIMIT_STORE_SIZE", "100000")) # seaux gardés en mémoire
+
+    # Déploiement multi-workers (serve.py) : état partagé entre les workers du nœud.
+    # "memory" : un seul processus ; "sqlite" : fichier local partagé (de préférence sur /dev/shm).
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+    SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "memory")
+    SHARED_STATE_PATH: str = os.getenv("SHARED_STATE_PATH", "/dev/shm/esport_shared_state.db" if os.path.isdir("/dev/shm")
+                                       else os.path.join(tempfile.gettempdir(), "esport_shared_state.db"))
+    SHARED_STATE_POLL_SECONDS: float = float(os.getenv("SHARED_STATE_POLL_SECONDS", "0.05"))
+
+    # Matchmaking
+    MATCH_MIN_SCORE: float = float(os.getenv("MATCH_MIN_SCORE", "0.5"))
+    MATCH_SCAN_LIMIT: int = int(os.getenv("MATCH_SCAN_LIMIT", "64")) # candidats examinés par tranche de niveau
+    MATCH_EXPIRE_MINUTES: int = int(os.getenv("MATCH_EXPIRE_MINUTES", "15"))
+    # Index des disponibilités (recherche de partenaires) : rechargement complet pour les écritures hors ORM
+    AVAILABILITY_REFRESH_SECONDS: float = float(os.getenv("AVAILABILITY_REFRESH_SECONDS", "600"))
+
+    # Écritures différées (dernière connexion, présence) : regroupées en mémoire puis écrites par lots
+    WRITE_BEHIND_FLUSH_SECONDS: float = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "2"))
+    WRITE_BEHIND_MAX_PENDING: int = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "100000")) # lignes en attente au plus
+    WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")) # lignes par UPDATE ... CASE
 
 settings = Settings()
\ No newline at end of file
@@ -1,14 +1,162 @@
-from sqlalchemy import create_engine
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from config import settings
+from metrics import Histogram, collector, metric_lines
 
-# Chaîne de connexion à MySQL
-SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+# Chaînes de connexion : driver synchrone (scripts, maintenance) et asynchrone (routes)
+if settings.DATABASE_BACKEND == "sqlite":
+    SQLALCHEMY_DATABASE_URL = f"sqlite:///{settings.SQLITE_PATH}"
+    SQLALCHEMY_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{settings.SQLITE_PATH}"
+else:
+    _credentials = f"{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+    SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{_credentials}"
+    SQLALCHEMY_ASYNC_DATABASE_URL = f"mysql+aiomysql://{_credentials}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+class PoolMetrics:
+    # Statistiques d'un pool : attente pour obtenir une connexion, timeouts, débordement
+    def __init__(self, name: str):
+        self.name = name
+        self.wait = Histogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.overflow_peak = 0
+        self.engine = None
+
+    def pool_class(self, base):
+        metrics = self
+
+        class TimedPool(base):
+            def connect(self):
+                start = time.perf_counter()
+                try:
+                    connection = super().connect()
+                except exc.TimeoutError:
+                    metrics.timeouts += 1
+                    raise
+                finally:
+                    metrics.wait.observe(time.perf_counter() - start)
+                metrics.checkouts += 1
+                metrics.overflow_peak = max(metrics.overflow_peak, self.overflow())
+                return connection
+
+        TimedPool.__name__ = f"Timed{base.__name__}"
+        return TimedPool
+
+    def gauges(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "db_pool_size": pool.size(),
+            "db_pool_checked_out": pool.checkedout(),
+            "db_pool_overflow_in_use": max(0, pool.overflow()),
+            "db_pool_overflow_peak": max(0, self.overflow_peak),
+            "db_pool_checkouts_total": self.checkouts,
+            "db_pool_timeouts_total": self.timeouts,
+        }
+
+
+_pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=pool_metrics.pool_class(QueuePool), **_pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=async_pool_metrics.pool_class(AsyncAdaptedQueuePool), **_pool_options)
+# expire_on_commit=False : pas de rechargement implicite (donc pas d'I/O cachée) après un commit
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+pool_metrics.engine = engine
+async_pool_metrics.engine = async_engine.sync_engine
+
+
+_POOL_METRICS = (
+    ("db_pool_size", "gauge", "Configured pool size"),
+    ("db_pool_checked_out", "gauge", "Connections currently checked out"),
+    ("db_pool_overflow_in_use", "gauge", "Overflow connections currently open"),
+    ("db_pool_overflow_peak", "gauge", "Highest overflow usage seen"),
+    ("db_pool_checkouts_total", "counter", "Successful connection checkouts"),
+    ("db_pool_timeouts_total", "counter", "Checkouts that hit DB_POOL_TIMEOUT"),
+)
+
+
+@collector
+def _pool_samples():
+    pools = [(p, {"pool": p.name}, p.gauges()) for p in (pool_metrics, async_pool_metrics)]
+    lines = []
+    for name, kind, help_text in _POOL_METRICS:
+        lines += metric_lines(name, kind, help_text, [(labels, gauges[name]) for _, labels, gauges in pools])
+    lines += metric_lines("db_pool_wait_seconds", "histogram", "Time spent acquiring a connection", [])
+    for p, labels, _ in pools:
+        lines += p.wait.samples("db_pool_wait_seconds", labels)
+    return lines
+
+
+class QueryStats:
+    # Requêtes SQL exécutées dans le contexte courant (une requête HTTP, un test...).
+    # Les compteurs s'emboîtent : un bloc mesuré à l'intérieur d'un autre compte aussi pour le parent.
+    __slots__ = ("count", "duration", "parent")
+
+    def __init__(self, parent: "QueryStats" = None):
+        self.count = 0
+        self.duration = 0.0
+        self.parent = parent
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+# Durée de chaque requête SQL, tous contextes confondus
+statement_durations = Histogram((0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    statement_durations.observe(elapsed)
+    stats = _query_stats.get()
+    while stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        stats = stats.parent
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def count_statements():
+    stats = QueryStats(_query_stats.get())
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+@collector
+def _statement_samples():
+    lines = metric_lines("db_statement_duration_seconds", "histogram", "Duration of one SQL statement", [])
+    return lines + statement_durations.samples("db_statement_duration_seconds")
+
+
 Base = declarative_base()
 
 # Dépendance pour obtenir une session de la base de données
@@ -17,4 +165,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Version asynchrone, utilisée par les routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,95 @@
+import time
+from database import count_statements
+from metrics import Histogram, collector, metric_lines
+
+QUANTILES = (0.5, 0.95, 0.99)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RouteStats:
+    __slots__ = ("latency", "statements", "sql_time")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.sql_time = Histogram()
+
+
+class RequestMetrics:
+    # Agrégats par (méthode, route) : le gabarit de route ("/games/{game_id}"), pas le chemin
+    # réel, pour garder un nombre de séries borné.
+    def __init__(self):
+        self.in_flight = 0
+        self.routes = {}
+        self.responses = {}
+
+    def record(self, method: str, route: str, status: int, elapsed: float, statements: int, sql_time: float):
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes.setdefault(key, RouteStats())
+        stats.latency.observe(elapsed)
+        stats.statements.observe(statements)
+        stats.sql_time.observe(sql_time)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+
+def route_label(scope) -> str:
+    # FastAPI renseigne scope["route"] une fois la route trouvée
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    # Middleware ASGI pur : un perf_counter, un compteur SQL (ContextVar) et trois observe() par requête
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500 # une exception non gérée finit en 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        with count_statements() as stats:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                metrics.in_flight -= 1
+                metrics.record(scope["method"], route_label(scope), status_code,
+                               time.perf_counter() - start, stats.count, stats.duration)
+
+
+request_metrics = RequestMetrics()
+
+
+@collector
+def _request_samples():
+    routes = sorted(request_metrics.routes.items())
+    lines = metric_lines("http_requests_in_flight", "gauge", "Requests currently being handled", [({}, request_metrics.in_flight)])
+    lines += metric_lines("http_responses_total", "counter", "Responses by route and status code",
+                          [({"method": m, "route": r, "status": s}, count)
+                           for (m, r, s), count in sorted(request_metrics.responses.items())])
+    lines += metric_lines("http_request_duration_quantile_seconds", "gauge", "Latency quantiles estimated from the histogram",
+                          [({"method": m, "route": r, "quantile": q}, round(stats.latency.quantile(q), 6))
+                           for (m, r), stats in routes for q in QUANTILES])
+    for name, attr, help_text in (
+        ("http_request_duration_seconds", "latency", "Request latency"),
+        ("http_request_sql_statements", "statements", "SQL statements issued per request"),
+        ("http_request_sql_duration_seconds", "sql_time", "Time spent in SQL per request"),
+    ):
+        lines += metric_lines(name, "histogram", help_text, [])
+        for (m, r), stats in routes:
+            lines += getattr(stats, attr).samples(name, {"method": m, "route": r})
+    return lines
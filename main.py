@@ -1,12 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware # Pour l'avenir, si nécessaire
-import api.users, api.profiles, api.games, api.matchmaking
-from database import engine, Base
+import api.users, api.profiles, api.games, api.matchmaking, api.metrics, api.notifications
+from database import engine, Base, AsyncSessionLocal
+from config import settings
+from matchmaker import matchmaker
+from auth import password_hasher, revocations
+from catalog import catalog
+from sweeper import sweeper
+from availability import availability_index
+from fastapi.responses import JSONResponse
+from serialization import FastJSONResponse
+from ratelimit import RateLimitMiddleware, SharedBucketStore, rate_limiter
+from instrumentation import RequestMetricsMiddleware, request_metrics
+from notifications import SharedStateBroker, hub
+from shared_state import shared_state
+from write_behind import write_behind
 
 # Création des tables (si elles n'existent pas encore dans la base de données)
 # Base.metadata.create_all(bind=engine) # !!! Uniquement pour les tests ! En production, utilise les migrations (Alembic)
 
-app = FastAPI(title="Esport Platform API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DATABASE_BACKEND == "sqlite":
+        # Base locale pour les tests de charge : on crée le schéma à la volée
+        Base.metadata.create_all(bind=engine)
+    # Chargement du pool de matchmaking à partir des requêtes actives
+    async with AsyncSessionLocal() as db:
+        await matchmaker.bootstrap(db)
+        await catalog.load(db)
+        await availability_index.load(db)
+        await revocations.bootstrap(db)
+    await shared_state.start()
+    if shared_state.shared:
+        # Plusieurs workers (serve.py --workers N) : limiteur, notifications, révocations, pool et index des disponibilités synchronisés
+        rate_limiter.use_store(SharedBucketStore(shared_state))
+        hub.use_broker(SharedStateBroker(shared_state))
+        revocations.use_shared_state(shared_state)
+        matchmaker.use_shared_state(shared_state)
+        availability_index.use_shared_state(shared_state)
+        sweeper.use_shared_state(shared_state)
+    background_tasks = [
+        asyncio.create_task(catalog.refresh_forever(settings.CATALOG_REFRESH_SECONDS)),
+        asyncio.create_task(sweeper.run_forever()),
+        asyncio.create_task(availability_index.refresh_forever(settings.AVAILABILITY_REFRESH_SECONDS)),
+        asyncio.create_task(write_behind.flush_forever()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    # Dernières connexions et présences encore en mémoire
+    await write_behind.flush()
+    await shared_state.close()
+    password_hasher.shutdown()
+
+app = FastAPI(
+    title="Esport Platform API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if settings.FAST_JSON else JSONResponse,
+)
+
+# Limitation de débit, ajoutée avant CORS pour que les réponses 429 portent aussi les en-têtes CORS
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
 # Configuration de CORS (si le frontend est sur un autre port)
 app.add_middleware(
@@ -15,16 +73,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Retry-After"],
 )
 
+# Mesures par route (latence, codes de retour, requêtes SQL), ajoutées en dernier : c'est le
+# middleware le plus externe, il voit aussi les réponses 429 et les préflights CORS
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
 # Inclusion des routeurs
 app.include_router(api.users.router)
 app.include_router(api.profiles.router)
 app.include_router(api.games.router)
 app.include_router(api.matchmaking.router)
+app.include_router(api.notifications.router)
+app.include_router(api.metrics.router)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Esport Platform API"}
 
-# Lancement : uvicorn main:app --reload
\ No newline at end of file
+# Lancement : uvicorn main:app --reload (développement) ou python serve.py --workers 4 (production)
\ No newline at end of file
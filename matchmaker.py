@@ -0,0 +1,403 @@
+import bisect
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, update, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from shared_state import SharedState, WORKER_ID
+from scoring import SKILL_TIERS, TIER_INDEX, Features, CandidateBatch, score_batch
+import models
+
+DEFAULT_TIER = 0
+
+# Types de requêtes compatibles entre eux (un mentor cherche un élève et inversement)
+_COUNTERPART = {
+    models.RequestTypeEnum.quick_match.value: models.RequestTypeEnum.quick_match.value,
+    models.RequestTypeEnum.find_team.value: models.RequestTypeEnum.find_team.value,
+    models.RequestTypeEnum.find_mentor.value: models.RequestTypeEnum.find_student.value,
+    models.RequestTypeEnum.find_student.value: models.RequestTypeEnum.find_mentor.value,
+}
+
+
+# Seules les préférences utiles au scoring sont lues (pas d'entité UserProfile complète)
+PROFILE_COLUMNS = [
+    models.UserProfile.preferred_game_modes,
+    models.UserProfile.preferred_playtime,
+    models.UserProfile.skill_level,
+]
+
+
+def skill_tier(level) -> int:
+    if level is None:
+        return DEFAULT_TIER
+    return TIER_INDEX.get(getattr(level, "value", level), DEFAULT_TIER)
+
+
+def naive_utc(value: datetime) -> datetime:
+    # La BD stocke des DateTime sans fuseau : on compare tout en UTC naïf
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class PoolEntry:
+    __slots__ = ("id", "user_id", "game_id", "request_type", "available_from", "available_until",
+                 "game_modes", "roles", "features", "slots", "capacity")
+
+    def __init__(self, request: models.MatchRequest, tier: int, profile=None):
+        self.id = request.id
+        self.user_id = request.user_id
+        self.game_id = request.game_id
+        self.request_type = request.request_type
+        self.available_from = naive_utc(request.available_from)
+        self.available_until = naive_utc(request.available_until)
+        self.game_modes = frozenset(request.preferred_game_modes or [])
+        self.roles = frozenset(request.preferred_roles or [])
+        self.features = Features.from_request(request, tier, profile)
+        # Nombre de partenaires recherchés au total / encore recherchés
+        self.capacity = max(1, (request.max_players or 2) - 1)
+        self.slots = self.capacity
+
+    @property
+    def tier(self):
+        return self.features.tier
+
+    @property
+    def key(self):
+        return (self.game_id, self.request_type, self.tier)
+
+    def to_message(self) -> dict:
+        # Copie JSON de l'entrée pour les autres workers (profil et préférences déjà encodés)
+        f = self.features
+        return {"id": self.id, "user_id": self.user_id, "game_id": self.game_id, "request_type": self.request_type,
+                "available_from": self.available_from.isoformat(), "available_until": self.available_until.isoformat(),
+                "game_modes": sorted(self.game_modes), "roles": sorted(self.roles), "slots": self.slots,
+                "capacity": self.capacity,
+                "features": [f.tier, f.tier_mask, f.modes, f.roles, f.playtime, f.level, f.start, f.end]}
+
+    @classmethod
+    def from_message(cls, data: dict):
+        entry = cls.__new__(cls)
+        for name in ("id", "user_id", "game_id", "request_type", "slots", "capacity"):
+            setattr(entry, name, data[name])
+        entry.available_from = datetime.fromisoformat(data["available_from"])
+        entry.available_until = datetime.fromisoformat(data["available_until"])
+        entry.game_modes = frozenset(data["game_modes"])
+        entry.roles = frozenset(data["roles"])
+        entry.features = Features(*data["features"])
+        return entry
+
+    def accepts_tier(self, tier: int) -> bool:
+        if self.features.tier_mask:
+            return bool(self.features.tier_mask >> tier & 1)
+        return abs(tier - self.tier) <= 1
+
+    def candidate_tiers(self):
+        if self.features.tier_mask:
+            return [t for t in range(len(SKILL_TIERS)) if self.features.tier_mask >> t & 1]
+        return [t for t in (self.tier, self.tier - 1, self.tier + 1) if 0 <= t < len(SKILL_TIERS)]
+
+
+class _Bucket:
+    # Requêtes d'un (jeu, type, tier) triées par available_from pour la recherche par bisect
+    __slots__ = ("keys", "entries")
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+
+    def add(self, entry: PoolEntry):
+        bisect.insort(self.keys, (entry.available_from, entry.id))
+        self.entries[entry.id] = entry
+
+    def discard(self, entry: PoolEntry):
+        if self.entries.pop(entry.id, None) is None:
+            return
+        i = bisect.bisect_left(self.keys, (entry.available_from, entry.id))
+        if i < len(self.keys) and self.keys[i] == (entry.available_from, entry.id):
+            del self.keys[i]
+
+    def overlapping(self, available_from: datetime, available_until: datetime, limit: int):
+        # Candidats qui commencent avant la fin de la fenêtre, du plus récent au plus ancien ;
+        # on s'arrête après `limit` candidats pour rester sous-linéaire.
+        i = bisect.bisect_left(self.keys, (available_until, -1))
+        scanned = 0
+        while i > 0 and scanned < limit:
+            i -= 1
+            entry = self.entries[self.keys[i][1]]
+            scanned += 1
+            if entry.available_until > available_from:
+                yield entry
+
+
+class Matchmaker:
+    CHANNEL = "matchmaker"
+
+    def __init__(self, min_score: float = settings.MATCH_MIN_SCORE, scan_limit: int = settings.MATCH_SCAN_LIMIT,
+                 match_ttl: timedelta = timedelta(minutes=settings.MATCH_EXPIRE_MINUTES)):
+        self.min_score = min_score
+        self.scan_limit = scan_limit
+        self.match_ttl = match_ttl
+        self._buckets = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._state = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, entry: PoolEntry):
+        self._buckets.setdefault(entry.key, _Bucket()).add(entry)
+        self._entries[entry.id] = entry
+
+    def _remove(self, entry: PoolEntry):
+        self._entries.pop(entry.id, None)
+        bucket = self._buckets.get(entry.key)
+        if bucket is not None:
+            bucket.discard(entry)
+            if not bucket.entries:
+                del self._buckets[entry.key]
+
+    def remove(self, request_id: int):
+        with self._lock:
+            entry = self._entries.get(request_id)
+            if entry is not None:
+                self._remove(entry)
+        if self._state is not None:
+            self._state.publish_soon(self.CHANNEL, {"origin": WORKER_ID, "upsert": [], "remove": [request_id]})
+
+    def use_shared_state(self, state: SharedState):
+        # Plusieurs workers : chaque pool reflète les ajouts et retraits des autres. Un pool peut
+        # avoir quelques dizaines de ms de retard : les places sont donc réservées dans l'état
+        # partagé (claim) avant l'insertion des matches.
+        self._state = state
+        state.subscribe(self.CHANNEL, self._on_remote_change)
+
+    async def broadcast(self, request_ids):
+        # Après submit() : état courant des requêtes touchées (encore en attente ou retirées)
+        if self._state is None:
+            return
+        request_ids = list(request_ids)
+        with self._lock:
+            entries = [self._entries.get(request_id) for request_id in request_ids]
+        await self._state.publish(self.CHANNEL, {
+            "origin": WORKER_ID,
+            "upsert": [entry.to_message() for entry in entries if entry is not None],
+            "remove": [request_id for request_id, entry in zip(request_ids, entries) if entry is None],
+        })
+
+    def _on_remote_change(self, message: dict):
+        if message["origin"] == WORKER_ID:
+            return
+        with self._lock:
+            for data in message["upsert"]:
+                entry = self._entries.get(data["id"])
+                if entry is not None:
+                    self._remove(entry)
+                self._add(PoolEntry.from_message(data))
+            for request_id in message["remove"]:
+                entry = self._entries.get(request_id)
+                if entry is not None:
+                    self._remove(entry)
+
+    def _candidates(self, entry: PoolEntry, now: datetime):
+        counterpart = _COUNTERPART.get(entry.request_type, entry.request_type)
+        for tier in entry.candidate_tiers():
+            bucket = self._buckets.get((entry.game_id, counterpart, tier))
+            if bucket is None:
+                continue
+            for candidate in list(bucket.overlapping(entry.available_from, entry.available_until, self.scan_limit)):
+                if candidate.available_until <= now:
+                    self._remove(candidate) # Nettoyage paresseux des requêtes périmées
+                elif candidate.user_id != entry.user_id and candidate.accepts_tier(entry.tier):
+                    yield candidate
+
+    def submit(self, request: models.MatchRequest, tier: int, profile=None, now: datetime = None,
+               journal: list = None) -> tuple[list[dict], list[int]]:
+        # Retourne les lignes Match à insérer et les requêtes désormais complètes.
+        # `journal` reçoit (requête, candidats retenus) pour revert() si le commit échoue.
+        now = now or datetime.utcnow()
+        entry = PoolEntry(request, tier, profile)
+        if entry.available_until <= now:
+            return [], []
+        with self._lock:
+            candidates = list(self._candidates(entry, now))
+            scored = []
+            if candidates:
+                # Un seul appel vectorisé pour tous les candidats
+                scores = score_batch(entry.features, CandidateBatch(c.features for c in candidates))
+                for i in scores.argsort()[::-1][:entry.slots]:
+                    if scores[i] < self.min_score:
+                        break
+                    scored.append((float(scores[i]), candidates[i]))
+
+            rows, filled = [], []
+            for score, candidate in scored:
+                rows.extend(self._match_rows(entry, candidate, score, now))
+                entry.slots -= 1
+                candidate.slots -= 1
+                if candidate.slots <= 0:
+                    self._remove(candidate)
+                    filled.append(candidate.id)
+            if entry.slots > 0:
+                self._add(entry)
+            else:
+                filled.append(entry.id)
+        if journal is not None:
+            journal.append((entry, [candidate for _, candidate in scored]))
+        return rows, filled
+
+    def revert(self, journal: list):
+        # Matches non enregistrés (commit en échec) : chaque requête retrouve ses places dans le
+        # pool, comme en BD où elle est restée active
+        with self._lock:
+            for entry, candidates in reversed(journal):
+                for pooled, taken in [(entry, len(candidates))] + [(candidate, 1) for candidate in candidates]:
+                    current = self._entries.get(pooled.id)
+                    if current is None:
+                        pooled.slots += taken
+                        self._add(pooled)
+                    else:
+                        current.slots += taken
+
+    async def _take(self, entry: PoolEntry, count: int) -> bool:
+        # Places prises sur la requête, tous workers confondus ; refusé au-delà de sa capacité
+        def take(taken):
+            taken = (taken or 0) + count
+            if taken > entry.capacity:
+                return taken - count, False
+            return taken, True
+        ttl = max(1.0, (entry.available_until - datetime.utcnow()).total_seconds())
+        return await self._state.update(f"{self.CHANNEL}:taken:{entry.id}", take, ttl)
+
+    async def claim(self, journal: list, rows: list[dict], filled: list[int]) -> tuple[list[dict], list[int]]:
+        # Après submit(), avant l'insertion : réserve une place sur chaque candidat retenu. Un
+        # candidat déjà complet pour un autre worker est abandonné (ses deux lignes Match
+        # retirées) et la requête récupère la place ; le journal ne garde que les candidats obtenus.
+        if self._state is None:
+            return rows, filled
+        lost_pairs, lost_ids, filled = set(), set(), list(filled)
+        for i, (entry, candidates) in enumerate(journal):
+            kept = []
+            for candidate in candidates:
+                if await self._take(candidate, 1):
+                    kept.append(candidate)
+                else:
+                    lost_pairs.update({(candidate.id, entry.user_id), (entry.id, candidate.user_id)})
+                    lost_ids.add(candidate.id)
+            if len(kept) < len(candidates):
+                with self._lock:
+                    current = self._entries.get(entry.id)
+                    if current is None:
+                        entry.slots += len(candidates) - len(kept)
+                        self._add(entry)
+                        filled.remove(entry.id)
+                    else:
+                        current.slots += len(candidates) - len(kept)
+                    for candidate_id in lost_ids:
+                        lost = self._entries.get(candidate_id)
+                        if lost is not None:
+                            self._remove(lost)
+                journal[i] = (entry, kept)
+            if kept:
+                await self._take(entry, len(kept))
+        if not lost_pairs:
+            return rows, filled
+        # Un candidat perdu est complet : c'est l'autre worker qui le clôt
+        rows = [row for row in rows if (row["match_request_id"], row["matched_user_id"]) not in lost_pairs]
+        return rows, [request_id for request_id in filled if request_id not in lost_ids]
+
+    async def release(self, journal: list):
+        # Commit en échec : les places réservées par claim() sont rendues
+        if self._state is None:
+            return
+        for entry, candidates in journal:
+            for candidate in candidates:
+                await self._take(candidate, -1)
+            if candidates:
+                await self._take(entry, -len(candidates))
+
+    def _match_rows(self, a: PoolEntry, b: PoolEntry, score: float, now: datetime) -> list[dict]:
+        expires_at = min(now + self.match_ttl, a.available_until, b.available_until)
+        common_modes = sorted(a.game_modes & b.game_modes) or sorted(a.game_modes | b.game_modes)
+        game_mode = common_modes[0] if common_modes else None
+        # Une ligne par côté : chaque joueur voit le match dans /matchmaking/matches/me
+        return [
+            {"match_request_id": a.id, "matched_user_id": b.user_id, "compatibility_score": score,
+             "game_id": a.game_id, "suggested_game_mode": game_mode,
+             "suggested_role": min(b.roles - a.roles or b.roles, default=None),
+             "status": models.MatchStatusEnum.pending, "expires_at": expires_at},
+            {"match_request_id": b.id, "matched_user_id": a.user_id, "compatibility_score": score,
+             "game_id": b.game_id, "suggested_game_mode": game_mode,
+             "suggested_role": min(a.roles - b.roles or a.roles, default=None),
+             "status": models.MatchStatusEnum.pending, "expires_at": expires_at},
+        ]
+
+    async def bootstrap(self, db: AsyncSession, now: datetime = None):
+        # Recharge les requêtes actives au démarrage
+        result = await db.execute(active_requests_query(now or datetime.utcnow()))
+        rows = result.all()
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            for row in rows:
+                self._add(PoolEntry(row[0], skill_tier(row[1]), row))
+        return len(rows)
+
+
+def active_requests_query(now: datetime):
+    # Requêtes actives avec le niveau et les préférences de leur auteur (chargement du pool)
+    return (
+        select(models.MatchRequest, models.UserGame.skill_level.label("game_skill_level"), *PROFILE_COLUMNS)
+        .outerjoin(models.UserGame, (models.UserGame.user_id == models.MatchRequest.user_id)
+                   & (models.UserGame.game_id == models.MatchRequest.game_id))
+        .outerjoin(models.UserProfile, models.UserProfile.user_id == models.MatchRequest.user_id)
+        .where(models.MatchRequest.status == "active", models.MatchRequest.available_until > now)
+    )
+
+
+def player_context_query(user_id: int, game_id: int):
+    # Niveau sur le jeu + préférences du profil, en une requête
+    return (
+        select(models.UserGame.skill_level.label("game_skill_level"), *PROFILE_COLUMNS)
+        .select_from(models.User)
+        .outerjoin(models.UserGame, (models.UserGame.user_id == models.User.id) & (models.UserGame.game_id == game_id))
+        .outerjoin(models.UserProfile, models.UserProfile.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )
+
+
+async def player_context(db: AsyncSession, user_id: int, game_id: int):
+    result = await db.execute(player_context_query(user_id, game_id))
+    row = result.first()
+    if row is None:
+        return DEFAULT_TIER, None
+    return skill_tier(row[0]), row
+
+
+def inserted_matches_query(pairs: list[tuple[int, int]]):
+    # Relecture des matches en attente d'après leurs couples (requête, joueur apparié). Le filtre
+    # redondant sur matched_user_id donne l'index (matched_user_id, status) au planificateur, qui
+    # sinon parcourt tous les matches en attente.
+    return select(models.Match).where(
+        models.Match.matched_user_id.in_(sorted({user_id for _, user_id in pairs})),
+        models.Match.status == models.MatchStatusEnum.pending,
+        tuple_(models.Match.match_request_id, models.Match.matched_user_id).in_(pairs),
+    )
+
+
+async def persist_matches(db: AsyncSession, rows: list[dict], filled: list[int]) -> list[models.Match]:
+    # Insertion groupée (executemany) des matches + clôture des requêtes complètes.
+    # Les lignes insérées sont relues (pour les notifications) : MySQL n'a pas de RETURNING.
+    matches = []
+    if rows:
+        await db.execute(insert(models.Match), rows)
+        pairs = [(row["match_request_id"], row["matched_user_id"]) for row in rows]
+        result = await db.execute(inserted_matches_query(pairs))
+        matches = result.scalars().all()
+    if filled:
+        await db.execute(update(models.MatchRequest).where(models.MatchRequest.id.in_(filled)).values(status="matched"))
+    return matches
+
+
+matchmaker = Matchmaker()
@@ -1,7 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON, DECIMAL, Date, UniqueConstraint, Index, TIMESTAMP
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, JSON, DECIMAL, Date, UniqueConstraint, Index, TIMESTAMP, func
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 import enum
+import uuid
+
+# SQLite (tests de charge) : même format que CURRENT_TIMESTAMP, sans microsecondes,
+# sinon les comparaisons de chaînes faussent la pagination par curseur
+Timestamp = TIMESTAMP().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"), "sqlite"
+)
 
 # Enums (si une typage stricte est nécessaire, sinon on peut utiliser String)
 class SkillLevelEnum(str, enum.Enum):
@@ -36,7 +44,7 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    uuid = Column(String(36), unique=True, index=True)
+    uuid = Column(String(36), unique=True, index=True, default=lambda: str(uuid.uuid4()))
     email = Column(String(255), unique=True, index=True, nullable=False)
     username = Column(String(50), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
@@ -47,22 +55,22 @@ class User(Base):
     password_reset_expires = Column(DateTime)
     is_active = Column(Boolean, default=True)
     is_banned = Column(Boolean, default=False)
-    ban_reason = Column(Text)
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
-    last_login = Column(TIMESTAMP)
+    ban_reason = deferred(Column(Text), raiseload=True)
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    last_login = Column(Timestamp)
 
     # Relation
-    profile = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
-    games = relationship("UserGame", back_populates="user", cascade="all, delete-orphan")
-    match_requests = relationship("MatchRequest", back_populates="user", cascade="all, delete-orphan")
-    matches_as_matched_user = relationship("Match", back_populates="matched_user")
+    profile = relationship("UserProfile", back_populates="user", lazy="raise_on_sql", uselist=False, cascade="all, delete-orphan")
+    games = relationship("UserGame", back_populates="user", lazy="raise_on_sql", cascade="all, delete-orphan")
+    match_requests = relationship("MatchRequest", back_populates="user", lazy="raise_on_sql", cascade="all, delete-orphan")
+    matches_as_matched_user = relationship("Match", back_populates="matched_user", lazy="raise_on_sql")
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True, index=True) # un profil par utilisateur, lu à chaque /profiles/me
     first_name = Column(String(100))
     last_name = Column(String(100))
     date_of_birth = Column(Date)
@@ -73,23 +81,24 @@ class UserProfile(Base):
     discord_username = Column(String(100))
     steam_id = Column(String(100))
     twitch_username = Column(String(100))
-    preferred_game_modes = Column(JSON)
-    preferred_playtime = Column(JSON)
+    preferred_game_modes = deferred(Column(JSON), raiseload=True)
+    preferred_playtime = deferred(Column(JSON), raiseload=True)
     skill_level = Column(Enum(SkillLevelEnum), default=SkillLevelEnum.beginner)
     looking_for = Column(String(50)) # ENUM dans la BD, mais pour l'instant une chaîne
-    availability_schedule = Column(JSON)
+    availability_schedule = deferred(Column(JSON), raiseload=True)
     is_available_now = Column(Boolean, default=False)
     profile_visibility = Column(String(20)) # ENUM dans la BD
     show_stats = Column(Boolean, default=True)
     allow_friend_requests = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     # Relation
-    user = relationship("User", back_populates="profile")
+    user = relationship("User", back_populates="profile", lazy="raise_on_sql")
 
 class Game(Base):
     __tablename__ = "games"
+    __table_args__ = (Index('ix_games_created_at_id', 'created_at', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -99,16 +108,16 @@ class Game(Base):
     is_active = Column(Boolean, default=True)
     icon_url = Column(String(500))
     banner_url = Column(String(500))
-    description = Column(Text)
+    description = deferred(Column(Text), raiseload=True)
     min_players = Column(Integer, default=1)
     max_players = Column(Integer, default=10)
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     # Relation
-    user_games = relationship("UserGame", back_populates="game")
-    match_requests = relationship("MatchRequest", back_populates="game")
-    matches = relationship("Match", back_populates="game")
+    user_games = relationship("UserGame", back_populates="game", lazy="raise_on_sql")
+    match_requests = relationship("MatchRequest", back_populates="game", lazy="raise_on_sql")
+    matches = relationship("Match", back_populates="game", lazy="raise_on_sql")
 
 class UserGame(Base):
     __tablename__ = "user_games"
@@ -123,16 +132,20 @@ class UserGame(Base):
     hours_played = Column(Integer, default=0)
     is_main_game = Column(Boolean, default=False)
     game_username = Column(String(100))
-    stats = Column(JSON)
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    stats = deferred(Column(JSON), raiseload=True)
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     # Relations
-    user = relationship("User", back_populates="games")
-    game = relationship("Game", back_populates="user_games")
+    user = relationship("User", back_populates="games", lazy="raise_on_sql")
+    game = relationship("Game", back_populates="user_games", lazy="raise_on_sql")
 
 class MatchRequest(Base):
     __tablename__ = "match_requests"
+    __table_args__ = (
+        Index('ix_match_requests_user_created', 'user_id', 'created_at', 'id'), # /matchmaking/requests/me
+        Index('ix_match_requests_status_until', 'status', 'available_until'), # chargement du pool, expiration
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -145,17 +158,22 @@ class MatchRequest(Base):
     max_players = Column(Integer, default=5)
     available_from = Column(DateTime, nullable=False)
     available_until = Column(DateTime, nullable=False)
-    status = Column(String(20)) # ENUM dans la BD, par défaut 'active'
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    status = Column(String(20), default="active") # ENUM dans la BD
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     # Relations
-    user = relationship("User", back_populates="match_requests")
-    game = relationship("Game", back_populates="match_requests")
-    matches = relationship("Match", back_populates="match_request") # Supposons qu'une requête puisse avoir plusieurs matches ?
+    user = relationship("User", back_populates="match_requests", lazy="raise_on_sql")
+    game = relationship("Game", back_populates="match_requests", lazy="raise_on_sql")
+    matches = relationship("Match", back_populates="match_request", lazy="raise_on_sql") # Supposons qu'une requête puisse avoir plusieurs matches ?
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        Index('ix_matches_matched_user_created', 'matched_user_id', 'created_at', 'id'), # /matchmaking/matches/me
+        Index('ix_matches_matched_user_status', 'matched_user_id', 'status'), # relecture des matches créés
+        Index('ix_matches_status_expires', 'status', 'expires_at'), # expiration des matches en attente
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     match_request_id = Column(Integer, ForeignKey('match_requests.id'), nullable=False)
@@ -166,12 +184,14 @@ class Match(Base):
     suggested_role = Column(String(50))
     status = Column(Enum(MatchStatusEnum), default=MatchStatusEnum.pending)
     expires_at = Column(DateTime, nullable=False)
-    created_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
-    updated_at = Column(TIMESTAMP, default="CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    created_at = Column(Timestamp, server_default=func.current_timestamp())
+    updated_at = Column(Timestamp, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     # Relations
-    match_request = relationship("MatchRequest", back_populates="matches")
-    matched_user = relationship("User", back_populates="matches_as_matched_user")
-    game = relationship("Game", back_populates="matches")
+    match_request = relationship("MatchRequest", back_populates="matches", lazy="raise_on_sql")
+    matched_user = relationship("User", back_populates="matches_as_matched_user", lazy="raise_on_sql")
+    game = relationship("Game", back_populates="matches", lazy="raise_on_sql")
 
-# Ajoutez des index si c'est important pour la performance, mais pour le MVP on peut se contenter de ceux dans la BD.
\ No newline at end of file
+# Colonnes lourdes (Text/JSON) différées et relations en lazy="raise_on_sql" : aucune requête implicite,
+# les routes chargent explicitement ce qu'elles lisent (load_only, selectinload...).
+# Les index des requêtes fréquentes sont déclarés dans __table_args__ ; benchmarks/check_query_plans.py vérifie qu'ils sont utilisés.
\ No newline at end of file
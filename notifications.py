@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from config import settings
+from metrics import collector, metric_lines
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+
+class Broker(ABC):
+    # Transport des notifications entre workers. L'implémentation en mémoire suffit pour un
+    # seul processus ; une implémentation partagée (Redis, etc.) n'a qu'à fournir ces deux méthodes.
+    @abstractmethod
+    async def publish(self, user_id: int, message: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, callback):
+        # callback(user_id, message) est appelé pour chaque message publié
+        ...
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._callbacks = []
+
+    async def publish(self, user_id: int, message: dict):
+        for callback in self._callbacks:
+            callback(user_id, message)
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+
+class SharedStateBroker(Broker):
+    # Plusieurs workers sur un nœud : les messages passent par l'état partagé, chaque worker
+    # livre ceux qui concernent ses propres connexions
+    CHANNEL = "notifications"
+
+    def __init__(self, state: SharedState):
+        self.state = state
+
+    async def publish(self, user_id: int, message: dict):
+        await self.state.publish(self.CHANNEL, {"user_id": user_id, "message": message})
+
+    def subscribe(self, callback):
+        self.state.subscribe(self.CHANNEL, lambda event: callback(event["user_id"], event["message"]))
+
+
+class NotificationHub:
+    # Connexions ouvertes (WebSocket / SSE) de ce worker, par utilisateur
+    def __init__(self, broker: Broker, queue_size: int):
+        self.queue_size = queue_size
+        self.delivered = 0
+        self.dropped = 0
+        self._connections = {}
+        self.broker = None
+        self.use_broker(broker)
+
+    def use_broker(self, broker: Broker):
+        self.broker = broker
+        broker.subscribe(self._deliver)
+
+    def connect(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._connections.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def disconnect(self, user_id: int, queue: asyncio.Queue):
+        queues = self._connections.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._connections[user_id]
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._connections.values())
+
+    async def publish(self, user_id: int, event: str, data: dict):
+        try:
+            await self.broker.publish(user_id, {"event": event, "data": data})
+        except Exception:
+            # Une notification perdue ne doit jamais faire échouer la requête qui l'a émise
+            logger.exception("Notification publish failed")
+
+    def _deliver(self, user_id: int, message: dict):
+        for queue in self._connections.get(user_id, ()):
+            if queue.full():
+                # Client trop lent : on jette le plus ancien message plutôt que de bloquer
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+            self.delivered += 1
+
+
+hub = NotificationHub(InMemoryBroker(), settings.NOTIFY_QUEUE_SIZE)
+
+
+@collector
+def _hub_samples():
+    return (
+        metric_lines("notification_connections", "gauge", "Open WebSocket/SSE connections", [({}, hub.connection_count)])
+        + metric_lines("notifications_delivered_total", "counter", "Messages pushed to client queues", [({}, hub.delivered)])
+        + metric_lines("notifications_dropped_total", "counter", "Messages dropped for slow clients", [({}, hub.dropped)])
+    )
@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime, timezone
+from fastapi import HTTPException, Response
+from sqlalchemy import or_, and_
+from config import settings
+
+# Pagination par curseur (keyset) sur (created_at, id) : pas d'OFFSET, donc pas de scan
+# des pages précédentes. Le curseur est opaque pour le client.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_ID = 2 ** 63 - 1 # BIGINT signé : au-delà, le pilote refuse de lier la valeur
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        created_at = datetime.fromisoformat(created_at) if created_at else datetime.min
+        if created_at.tzinfo is not None:
+            # Curseur forgé avec un fuseau : les dates de la BD sont en UTC naïf
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        # Un vrai entier (ni booléen ni flottant) dans la plage des ids
+        if type(id) is not int or not 0 <= id <= MAX_ID:
+            raise ValueError("cursor id out of range")
+        return created_at, id
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_size(limit: int) -> int:
+    # Plafond imposé côté serveur, quelle que soit la demande du client
+    return max(1, min(limit, settings.PAGE_SIZE_MAX))
+
+
+def keyset(query, model, cursor: str | None, limit: int):
+    # Du plus récent au plus ancien ; forme développée du (created_at, id) < (:c, :id)
+    # pour que MySQL comme SQLite utilisent l'index composite.
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < id),
+        ))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+
+
+def next_cursor_headers(rows, limit: int) -> dict:
+    # Page pleine : il y a peut-être une suite
+    if len(rows) == limit:
+        last = rows[-1]
+        return {NEXT_CURSOR_HEADER: encode_cursor(last.created_at, last.id)}
+    return {}
+
+
+def set_next_cursor(response: Response, rows, limit: int):
+    response.headers.update(next_cursor_headers(rows, limit))
@@ -0,0 +1,179 @@
+import math
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from jose import JWTError
+from starlette.responses import JSONResponse
+from config import settings
+from metrics import collector, metric_lines
+from shared_state import SharedState
+import auth
+
+
+class Limit:
+    __slots__ = ("capacity", "rate")
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period # jetons rechargés par seconde
+
+
+def parse_limits(spec: str) -> dict:
+    # "POST /users/login=5/60; GET /metrics=off; *=120/60"
+    #   -> {"POST /users/login": Limit(5, 60), "GET /metrics": None, "*": Limit(120, 60)}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        route, _, value = item.rpartition("=")
+        capacity, _, period = value.strip().partition("/")
+        route = " ".join(route.split())
+        limits[route] = None if capacity == "off" else Limit(int(capacity), float(period or 1))
+    return limits
+
+
+class BucketStore(ABC):
+    # Stockage des seaux. La version en mémoire suffit pour un seul processus ; une version
+    # partagée entre workers (Redis, etc.) n'a qu'à fournir cette méthode.
+    @abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        # Consomme un jeton ; retourne 0 si la requête passe, sinon le délai d'attente en secondes.
+        # Chaque stockage lit sa propre horloge.
+        ...
+
+
+class InMemoryBucketStore(BucketStore):
+    # LRU borné : O(1) par vérification, les clés les moins récentes sont oubliées
+    # (un seau oublié repart plein, ce qui reste du côté permissif).
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit.capacity), now]
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / limit.rate
+
+
+class SharedBucketStore(BucketStore):
+    # Seaux dans l'état partagé du nœud : la limite vaut pour l'ensemble des workers.
+    # Horloge murale (time.time) : la seule comparable d'un processus à l'autre.
+    def __init__(self, state: SharedState):
+        self.state = state
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.time()
+
+        def consume(bucket):
+            tokens, stamp = bucket if bucket else (float(limit.capacity), now)
+            tokens = min(limit.capacity, tokens + (now - stamp) * limit.rate)
+            if tokens >= 1:
+                return [tokens - 1, now], 0.0
+            return [tokens, now], (1 - tokens) / limit.rate
+        # Un seau inutilisé pendant `capacity / rate` secondes est plein : inutile de le garder
+        return await self.state.update(f"ratelimit:{key}", consume, ttl=limit.capacity / limit.rate)
+
+
+def _bearer_token(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+
+def client_keys(scope) -> list[str]:
+    # Toujours l'adresse IP (une IP qui change de compte ou de jeton reste limitée) ; en plus
+    # l'id de l'utilisateur authentifié (un compte qui change d'IP aussi). Le jeton n'est que
+    # décodé (cache de auth), sans accès à la BD. Le seau de l'utilisateur vient en premier.
+    client = scope.get("client")
+    keys = [f"ip:{client[0] if client else 'unknown'}"]
+    token = _bearer_token(scope)
+    if token:
+        try:
+            user_id = auth.decode_token(token).get("sub")
+        except JWTError:
+            user_id = None
+        if user_id is not None:
+            keys.insert(0, f"user:{user_id}")
+    return keys
+
+
+class RateLimiter:
+    def __init__(self, limits: dict, store: BucketStore):
+        self.default = limits.pop("*", None)
+        self.limits = limits
+        self.store = store
+        self.allowed = 0
+        self.rejected = {}
+
+    def use_store(self, store: BucketStore):
+        self.store = store
+
+    def limit_for(self, method: str, path: str):
+        # Route exacte d'abord ("POST /matchmaking/requests/"), puis la limite par défaut
+        route = f"{method} {path}"
+        if route in self.limits:
+            return route, self.limits[route]
+        return "*", self.default
+
+    async def check(self, scope) -> float:
+        route, limit = self.limit_for(scope["method"], scope["path"])
+        if limit is None:
+            return 0.0
+        for key in client_keys(scope):
+            # Premier seau vide : on s'arrête et les suivants ne sont pas débités. Le seau de
+            # l'utilisateur passe avant celui de l'IP : un compte au-delà de sa propre limite ne
+            # vide pas le seau partagé par les autres clients derrière le même NAT ou proxy.
+            retry_after = await self.store.take(f"{route}|{key}", limit)
+            if retry_after:
+                break
+        if retry_after:
+            self.rejected[route] = self.rejected.get(route, 0) + 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+
+class RateLimitMiddleware:
+    # Middleware ASGI pur (pas de BaseHTTPMiddleware) : pas de tâche ni de copie du corps par requête
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            retry_after = await self.limiter.check(scope)
+            if retry_after:
+                response = JSONResponse({"detail": "Too many requests"}, status_code=429,
+                                        headers={"Retry-After": str(math.ceil(retry_after))})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+rate_limiter = RateLimiter(parse_limits(settings.RATE_LIMITS), InMemoryBucketStore(settings.RATE_LIMIT_STORE_SIZE))
+
+
+@collector
+def _rate_limit_samples():
+    store = rate_limiter.store
+    return (
+        metric_lines("rate_limit_allowed_total", "counter", "Requests that passed a rate limit", [({}, rate_limiter.allowed)])
+        + metric_lines("rate_limit_rejected_total", "counter", "Requests rejected with 429",
+                       [({"route": route}, count) for route, count in rate_limiter.rejected.items()])
+        + (metric_lines("rate_limit_buckets", "gauge", "Buckets held in memory", [({}, len(store))])
+           if isinstance(store, InMemoryBucketStore) else [])
+    )
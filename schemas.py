@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 import enum
 
@@ -41,6 +41,7 @@ class UserProfileBase(BaseModel):
     skill_level: Optional[str] = None # On utilise str pour la simplicité
     looking_for: Optional[str] = None
     is_available_now: Optional[bool] = None
+    availability_schedule: Optional[Dict[str, List[str]]] = None # heure locale, ex. {"mon": ["18:00-23:00"]}
     profile_visibility: Optional[str] = "public"
     show_stats: Optional[bool] = True
     allow_friend_requests: Optional[bool] = True
@@ -60,6 +61,9 @@ class UserProfile(UserProfileBase):
     class Config:
         from_attributes = True
 
+class Heartbeat(BaseModel):
+    is_available_now: bool = True
+
 # --- Schémas Jeu ---
 class GameBase(BaseModel):
     name: str
@@ -101,6 +105,15 @@ class MatchRequest(MatchRequestBase):
     class Config:
         from_attributes = True
 
+class MatchRequestBatchCreate(BaseModel):
+    items: List[MatchRequestCreate] = Field(min_length=1, max_length=100) # une escouade / un lobby entier
+
+class MatchRequestBatchItem(BaseModel):
+    index: int # position dans la requête
+    ok: bool
+    request: Optional[MatchRequest] = None
+    error: Optional[str] = None
+
 # --- Schémas Match ---
 class MatchBase(BaseModel):
     match_request_id: int
@@ -122,6 +135,14 @@ class Match(MatchBase):
     class Config:
         from_attributes = True
 
+# --- Schémas Recherche de partenaires ---
+class Candidate(BaseModel):
+    user_id: int
+    skill_level: str
+    is_main_game: bool
+    available_now: bool
+    coverage: float # part de la fenêtre demandée couverte par les disponibilités du joueur
+
 # --- Schémas Token ---
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,166 @@
+import zlib
+from datetime import datetime, timezone
+import numpy as np
+import models
+
+# Ordre des niveaux : l'index sert de "tranche" (tier)
+SKILL_TIERS = [level.value for level in models.UserGameSkillLevelEnum]
+TIER_INDEX = {name: i for i, name in enumerate(SKILL_TIERS)}
+PROFILE_LEVELS = [level.value for level in models.SkillLevelEnum]
+PROFILE_LEVEL_INDEX = {name: i for i, name in enumerate(PROFILE_LEVELS)}
+
+# Pondération du score de compatibilité (somme = 1)
+SKILL_WEIGHT = 0.30
+MODES_WEIGHT = 0.20
+ROLES_WEIGHT = 0.15
+TIME_WEIGHT = 0.25
+PLAYTIME_WEIGHT = 0.05
+LEVEL_WEIGHT = 0.05
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_tags(values) -> int:
+    # Liste JSON de chaînes -> bitset 64 bits (hachage stable, identique sur tous les workers)
+    bits = 0
+    for value in values or ():
+        bits |= 1 << (zlib.crc32(str(value).lower().encode()) & 63)
+    return bits
+
+
+def encode_tiers(levels) -> int:
+    bits = 0
+    for level in levels or ():
+        if level in TIER_INDEX:
+            bits |= 1 << TIER_INDEX[level]
+    return bits
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+class Features:
+    # Représentation compacte d'une requête (+ profil du joueur) pour le scoring
+    __slots__ = ("tier", "tier_mask", "modes", "roles", "playtime", "level", "start", "end")
+
+    def __init__(self, tier, tier_mask=0, modes=0, roles=0, playtime=0, level=-1, start=0.0, end=0.0):
+        self.tier = tier
+        self.tier_mask = tier_mask
+        self.modes = modes
+        self.roles = roles
+        self.playtime = playtime
+        self.level = level
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_request(cls, request: models.MatchRequest, tier: int, profile=None):
+        modes = list(request.preferred_game_modes or [])
+        playtime, level = None, None
+        if profile is not None:
+            modes += profile.preferred_game_modes or []
+            playtime = profile.preferred_playtime
+            level = getattr(profile.skill_level, "value", profile.skill_level)
+        return cls(
+            tier=tier,
+            tier_mask=encode_tiers(request.preferred_skill_levels),
+            modes=encode_tags(modes),
+            roles=encode_tags(request.preferred_roles),
+            playtime=encode_tags(playtime),
+            level=PROFILE_LEVEL_INDEX.get(level, -1),
+            start=_timestamp(request.available_from),
+            end=_timestamp(request.available_until),
+        )
+
+
+class CandidateBatch:
+    # Les mêmes champs en colonnes NumPy, pour scorer des milliers de candidats en un appel
+    __slots__ = ("tier", "tier_mask", "modes", "roles", "playtime", "level", "start", "end")
+
+    def __init__(self, features):
+        features = list(features)
+        n = len(features)
+        self.tier = np.fromiter((f.tier for f in features), dtype=np.int8, count=n)
+        self.tier_mask = np.fromiter((f.tier_mask for f in features), dtype=np.uint8, count=n)
+        self.modes = np.fromiter((f.modes for f in features), dtype=np.uint64, count=n)
+        self.roles = np.fromiter((f.roles for f in features), dtype=np.uint64, count=n)
+        self.playtime = np.fromiter((f.playtime for f in features), dtype=np.uint64, count=n)
+        self.level = np.fromiter((f.level for f in features), dtype=np.int8, count=n)
+        self.start = np.fromiter((f.start for f in features), dtype=np.float64, count=n)
+        self.end = np.fromiter((f.end for f in features), dtype=np.float64, count=n)
+
+    def __len__(self):
+        return len(self.tier)
+
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _jaccard_batch(query: int, values: np.ndarray) -> np.ndarray:
+    q = np.uint64(query)
+    union = _popcount(values | q).astype(np.float64)
+    inter = _popcount(values & q).astype(np.float64)
+    ratio = np.divide(inter, union, out=np.zeros_like(union), where=union > 0)
+    # Pas de préférence d'un côté : neutre
+    return np.where((values == 0) | (query == 0), 0.5, ratio)
+
+
+def score_batch(query: Features, batch: CandidateBatch) -> np.ndarray:
+    tier = np.int8(query.tier)
+    tier_gap = np.abs(batch.tier.astype(np.int16) - query.tier)
+    if query.tier_mask:
+        mutual = ((np.uint8(query.tier_mask) >> batch.tier.astype(np.uint8)) & 1) & ((batch.tier_mask >> np.uint8(tier)) & 1)
+        skill = np.where(batch.tier_mask > 0, mutual.astype(np.float64), 1.0 - tier_gap / (len(SKILL_TIERS) - 1))
+    else:
+        skill = 1.0 - tier_gap / (len(SKILL_TIERS) - 1)
+
+    modes = _jaccard_batch(query.modes, batch.modes)
+    # Pour les rôles on cherche la complémentarité, pas la ressemblance
+    roles = np.where((batch.roles == 0) | (query.roles == 0), 0.5, 1.0 - _jaccard_batch(query.roles, batch.roles) * 0.75)
+    playtime = _jaccard_batch(query.playtime, batch.playtime)
+
+    overlap = np.minimum(batch.end, query.end) - np.maximum(batch.start, query.start)
+    shortest = np.minimum(batch.end - batch.start, query.end - query.start)
+    time = np.clip(np.divide(overlap, shortest, out=np.zeros_like(overlap), where=shortest > 0), 0.0, 1.0)
+
+    if query.level >= 0:
+        level = np.where(batch.level >= 0, 1.0 - np.abs(batch.level.astype(np.int16) - query.level) / (len(PROFILE_LEVELS) - 1), 0.5)
+    else:
+        level = np.full(len(batch), 0.5)
+
+    score = (SKILL_WEIGHT * skill + MODES_WEIGHT * modes + ROLES_WEIGHT * roles
+             + TIME_WEIGHT * time + PLAYTIME_WEIGHT * playtime + LEVEL_WEIGHT * level)
+    return np.round(score, 2) # DECIMAL(3,2) en BD
+
+
+def _jaccard(a: int, b: int) -> float:
+    if not a or not b:
+        return 0.5
+    return (a & b).bit_count() / (a | b).bit_count()
+
+
+def score_pair(a: Features, b: Features) -> float:
+    # Version Python de référence (un couple à la fois), même formule que score_batch
+    if a.tier_mask and b.tier_mask:
+        skill = float(bool(a.tier_mask >> b.tier & 1) and bool(b.tier_mask >> a.tier & 1))
+    else:
+        skill = 1.0 - abs(a.tier - b.tier) / (len(SKILL_TIERS) - 1)
+    modes = _jaccard(a.modes, b.modes)
+    roles = 0.5 if not a.roles or not b.roles else 1.0 - _jaccard(a.roles, b.roles) * 0.75
+    playtime = _jaccard(a.playtime, b.playtime)
+    overlap = min(a.end, b.end) - max(a.start, b.start)
+    shortest = min(a.end - a.start, b.end - b.start)
+    time = max(0.0, min(1.0, overlap / shortest)) if shortest > 0 else 0.0
+    level = 1.0 - abs(a.level - b.level) / (len(PROFILE_LEVELS) - 1) if a.level >= 0 and b.level >= 0 else 0.5
+    score = (SKILL_WEIGHT * skill + MODES_WEIGHT * modes + ROLES_WEIGHT * roles
+             + TIME_WEIGHT * time + PLAYTIME_WEIGHT * playtime + LEVEL_WEIGHT * level)
+    return round(score, 2)
@@ -0,0 +1,29 @@
+from decimal import Decimal
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value):
+    # orjson gère datetime/enum nativement ; DECIMAL (compatibility_score) est rendu en float comme avec Pydantic
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def projection(model, schema) -> list:
+    # Colonnes du modèle correspondant aux champs du schéma, dans le même ordre :
+    # on lit des tuples au lieu d'hydrater des entités ORM
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def rows_response(rows, headers: dict = None) -> FastJSONResponse:
+    return FastJSONResponse([row._asdict() for row in rows], headers=headers)
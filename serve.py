@@ -0,0 +1,29 @@
+# Lancement en production : plusieurs processus uvicorn derrière le même port.
+# Avec plus d'un worker, l'état partagé passe par SQLite (SHARED_STATE_BACKEND=sqlite) :
+# limiteur de débit, notifications, révocations, pool de matchmaking et index des disponibilités.
+# Lancement : python serve.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+import argparse
+import os
+import uvicorn
+from config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS)
+    args = parser.parse_args()
+    if args.workers > 1:
+        # Lu par chaque worker à l'import de config (variables d'environnement héritées)
+        os.environ.setdefault("SHARED_STATE_BACKEND", "sqlite")
+        if os.environ["SHARED_STATE_BACKEND"] == "sqlite":
+            # État d'un lancement précédent (baux, seaux, événements) : périmé
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(settings.SHARED_STATE_PATH + suffix):
+                    os.remove(settings.SHARED_STATE_PATH + suffix)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
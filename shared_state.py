@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from metrics import collector, metric_lines
+
+logger = logging.getLogger(__name__)
+
+# Identifiant de ce processus : permet d'ignorer ses propres messages quand c'est utile
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class SharedState(ABC):
+    # État partagé entre les workers d'un même nœud : clé/valeur avec TTL, mise à jour atomique
+    # (compteurs, seaux du limiteur, baux) et pub/sub. Les valeurs sont du JSON.
+    shared = False # True si d'autres processus voient les mêmes données
+
+    def __init__(self):
+        self._pending = set()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str, default=None):
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value, ttl: float = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def update(self, key: str, fn, ttl: float = None):
+        # Atomique : fn(valeur actuelle ou None) -> (nouvelle valeur ou None pour supprimer, résultat)
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback):
+        # callback(message) est appelé dans la boucle d'événements de chaque worker abonné
+        ...
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        def add(value):
+            value = (value or 0) + amount
+            return value, value
+        return await self.update(key, add, ttl)
+
+    async def acquire_lease(self, name: str, ttl: float) -> bool:
+        # Bail renouvelable : une seule tâche de fond "singleton" (balayage...) par nœud
+        now = time.time()
+
+        def take(value):
+            if value is None or value[0] == WORKER_ID or value[1] <= now:
+                return [WORKER_ID, now + ttl], True
+            return value, False
+        return await self.update(f"lease:{name}", take, ttl)
+
+    def publish_soon(self, channel: str, message: dict):
+        # Depuis du code synchrone (événements ORM) : publication en tâche de fond
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # script hors boucle d'événements : pas d'autres workers à prévenir
+        task = loop.create_task(self.publish(channel, message))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+
+class InMemorySharedState(SharedState):
+    # Un seul processus : dictionnaire + rappels directs
+    def __init__(self):
+        super().__init__()
+        self._data = {}
+        self._subscribers = {}
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str, default=None):
+        item = self._live(key)
+        return default if item is None else item[0]
+
+    async def set(self, key: str, value, ttl: float = None):
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def update(self, key: str, fn, ttl: float = None):
+        item = self._live(key)
+        value, result = fn(None if item is None else item[0])
+        if value is None:
+            self._data.pop(key, None)
+        else:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+        return result
+
+    async def publish(self, channel: str, message: dict):
+        for callback in self._subscribers.get(channel, ()):
+            callback(message)
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+
+class SQLiteSharedState(SharedState):
+    # Fichier SQLite local (mode WAL) partagé par les workers du nœud ; idéalement sur /dev/shm.
+    # Les accès passent par un thread dédié (une connexion) pour ne pas bloquer la boucle ;
+    # le pub/sub est une table d'événements relue toutes les `poll_interval` secondes.
+    shared = True
+    EVENT_RETENTION = 60.0 # secondes : un worker en retard de plus que ça perd des messages
+    CLEANUP_EVERY = 200 # relectures entre deux passes de ménage
+
+    def __init__(self, path: str, poll_interval: float):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.published = 0
+        self.received = 0
+        self._subscribers = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self._conn = None
+        self._last_event = 0
+        self._polls = 0
+        self._poller = None
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # état reconstructible : la durabilité stricte n'est pas utile
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                     "payload TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._conn = conn
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def start(self):
+        self._last_event = await self._call(self._open)
+        self._poller = asyncio.create_task(self._poll_forever())
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def _get(self, key: str):
+        row = self._conn.execute("SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                                 (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    async def get(self, key: str, default=None):
+        value = await self._call(self._get, key)
+        return default if value is None else value
+
+    def _set(self, key: str, value, ttl: float = None):
+        self._conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), time.time() + ttl if ttl else None))
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self._call(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._call(self._conn.execute, "DELETE FROM kv WHERE key = ?", (key,))
+
+    def _update(self, key: str, fn, ttl: float = None):
+        # BEGIN IMMEDIATE : verrou d'écriture pris d'emblée, lecture + écriture sans concurrent
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            value, result = fn(self._get(key))
+            if value is None:
+                self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            else:
+                self._set(key, value, ttl)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return result
+
+    async def update(self, key: str, fn, ttl: float = None):
+        return await self._call(self._update, key, fn, ttl)
+
+    def _publish(self, channel: str, payload: str):
+        self._conn.execute("INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)", (channel, payload, time.time()))
+
+    async def publish(self, channel: str, message: dict):
+        await self._call(self._publish, channel, json.dumps(message))
+        self.published += 1
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def _poll(self, after: int):
+        rows = self._conn.execute("SELECT id, channel, payload FROM events WHERE id > ? ORDER BY id LIMIT 1000", (after,)).fetchall()
+        self._polls += 1
+        if self._polls % self.CLEANUP_EVERY == 0:
+            # Ménage occasionnel : vieux événements et clés expirées
+            now = time.time()
+            self._conn.execute("DELETE FROM events WHERE created_at < ?", (now - self.EVENT_RETENTION,))
+            self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        return rows
+
+    async def _poll_forever(self):
+        while True:
+            try:
+                rows = await self._call(self._poll, self._last_event)
+                for event_id, channel, payload in rows:
+                    self._last_event = event_id
+                    message = json.loads(payload)
+                    self.received += 1
+                    for callback in self._subscribers.get(channel, ()):
+                        try:
+                            callback(message)
+                        except Exception:
+                            logger.exception("Shared state subscriber failed on %s", channel)
+                if len(rows) == 1000:
+                    continue # encore du retard à rattraper
+            except Exception:
+                logger.exception("Shared state poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+
+def create_shared_state() -> SharedState:
+    if settings.SHARED_STATE_BACKEND == "sqlite":
+        return SQLiteSharedState(settings.SHARED_STATE_PATH, settings.SHARED_STATE_POLL_SECONDS)
+    return InMemorySharedState()
+
+
+shared_state = create_shared_state()
+
+
+@collector
+def _shared_state_samples():
+    if not isinstance(shared_state, SQLiteSharedState):
+        return []
+    return (
+        metric_lines("shared_state_published_total", "counter", "Messages published to other workers", [({}, shared_state.published)])
+        + metric_lines("shared_state_received_total", "counter", "Messages received from the shared event table", [({}, shared_state.received)])
+    )
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select, update
+from config import settings
+from database import AsyncSessionLocal
+from matchmaker import matchmaker
+from metrics import Histogram, collector, metric_lines
+from notifications import hub
+from shared_state import SharedState
+import models
+
+logger = logging.getLogger(__name__)
+
+
+# Tables balayées : (modèle, colonne statut, colonne d'expiration, statut actif, statut expiré, colonne utilisateur)
+MATCH_EXPIRY = (models.Match, models.Match.status, models.Match.expires_at,
+                models.MatchStatusEnum.pending, models.MatchStatusEnum.expired, models.Match.matched_user_id)
+REQUEST_EXPIRY = (models.MatchRequest, models.MatchRequest.status, models.MatchRequest.available_until,
+                  "active", "expired", models.MatchRequest.user_id)
+
+
+def expiring_query(target: tuple, now: datetime, limit: int):
+    # Prochain lot de lignes encore actives mais périmées : (id, utilisateur)
+    model, status_column, expiry_column, active_status, _, user_column = target
+    return select(model.id, user_column).where(status_column == active_status, expiry_column < now).limit(limit)
+
+
+class SweepReport:
+    __slots__ = ("matches", "requests", "batches", "duration")
+
+    def __init__(self):
+        self.matches = 0
+        self.requests = 0
+        self.batches = 0
+        self.duration = 0.0
+
+
+class ExpirySweeper:
+    # Passe périodiquement en "expired" les matches et requêtes périmés, par petits lots
+    # (une transaction courte par lot, via les index (status, expires_at) / (status, available_until))
+    def __init__(self, interval: float, batch_size: int, max_batches: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.expired = {"match": 0, "match_request": 0}
+        self.durations = Histogram()
+        self.last_report = None
+        self._state = None
+
+    def use_shared_state(self, state: SharedState):
+        # Plusieurs workers : un seul balaye à la fois (bail renouvelé à chaque passage)
+        self._state = state
+
+    async def _expire_batch(self, target: tuple, now: datetime) -> tuple[int, list]:
+        # Retourne le nombre de lignes sélectionnées et les (id, utilisateur) réellement expirés
+        model, status_column, _, active_status, expired_status, _ = target
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(expiring_query(target, now, self.batch_size))
+            rows = result.all()
+            ids = [row[0] for row in rows]
+            if ids:
+                # On revérifie le statut : une ligne acceptée entre-temps n'est pas écrasée
+                result = await db.execute(
+                    update(model).where(model.id.in_(ids), status_column == active_status).values(status=expired_status)
+                )
+                if result.rowcount < len(ids):
+                    # Cas rare : on ne garde que les lignes passées à "expired" par cette mise à jour
+                    changed = await db.execute(select(model.id).where(model.id.in_(ids), status_column == expired_status))
+                    changed = set(changed.scalars())
+                    rows = [row for row in rows if row[0] in changed]
+                await db.commit()
+            return len(ids), rows
+
+    async def sweep_once(self, now: datetime = None) -> SweepReport:
+        now = now or datetime.utcnow()
+        report = SweepReport()
+        start = time.perf_counter()
+        # Un budget de lots par table : un arriéré de matches ne bloque pas l'expiration des requêtes
+        for _ in range(self.max_batches):
+            selected, rows = await self._expire_batch(MATCH_EXPIRY, now)
+            if not selected:
+                break
+            report.batches += 1
+            report.matches += len(rows)
+            for match_id, user_id in rows:
+                await hub.publish(user_id, "match.status", {"id": match_id, "status": models.MatchStatusEnum.expired.value})
+        for _ in range(self.max_batches):
+            selected, rows = await self._expire_batch(REQUEST_EXPIRY, now)
+            if not selected:
+                break
+            report.batches += 1
+            report.requests += len(rows)
+            for request_id, _ in rows:
+                matchmaker.remove(request_id)
+        report.duration = time.perf_counter() - start
+        self.expired["match"] += report.matches
+        self.expired["match_request"] += report.requests
+        self.durations.observe(report.duration)
+        self.last_report = report
+        if report.batches:
+            logger.info("Expiry sweep: %d matches, %d requests in %d batches (%.3fs)",
+                        report.matches, report.requests, report.batches, report.duration)
+        return report
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self._state is not None and not await self._state.acquire_lease("sweeper", self.interval * 3):
+                    continue
+                await self.sweep_once()
+            except Exception:
+                logger.exception("Expiry sweep failed")
+
+
+sweeper = ExpirySweeper(settings.SWEEP_INTERVAL_SECONDS, settings.SWEEP_BATCH_SIZE, settings.SWEEP_MAX_BATCHES)
+
+
+@collector
+def _sweeper_samples():
+    lines = metric_lines("expired_rows_total", "counter", "Rows moved to expired by the sweeper",
+                         [({"table": table}, count) for table, count in sweeper.expired.items()])
+    lines += metric_lines("expiry_sweep_duration_seconds", "histogram", "Duration of one expiry sweep", [])
+    return lines + sweeper.durations.samples("expiry_sweep_duration_seconds")
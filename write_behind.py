@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import case, update
+from config import settings
+from database import AsyncSessionLocal
+from metrics import Histogram, collector, metric_lines
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    # Mises à jour fréquentes où seule la dernière valeur compte (dernière connexion, présence) :
+    # gardées en mémoire par (colonne, clé), puis écrites par lots toutes les `interval` secondes,
+    # une requête UPDATE ... SET col = CASE clé WHEN ... END par tranche de `batch_size` lignes.
+    # Les requêtes HTTP n'attendent donc pas la BD. Ce qui n'est pas encore écrit est perdu si le
+    # processus est tué (l'arrêt normal vide le tampon) : à réserver aux données sans enjeu.
+    EARLY_FLUSH = 0.5 # part de max_pending qui déclenche une écriture sans attendre l'intervalle
+
+    def __init__(self, interval: float, max_pending: int, batch_size: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.written = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failures = 0
+        self.durations = Histogram()
+        self._pending = {} # (modèle, colonne) -> {clé: valeur}
+        self._in_flight = {} # valeurs de l'écriture en cours, même forme
+        self._key_columns = {} # (modèle, colonne) -> nom de la colonne clé
+        self._size = 0
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def set(self, column, key_column, key, value):
+        # column / key_column : attributs ORM, ex. models.User.last_login, models.User.id
+        group = (column.class_, column.key)
+        self._key_columns[group] = key_column.key
+        values = self._pending.setdefault(group, {})
+        if key in values:
+            self.coalesced += 1
+        elif self._size >= self.max_pending:
+            # Écritures en échec ou en retard : on garde la mémoire bornée, la valeur est perdue
+            self.dropped += 1
+            return
+        else:
+            self._size += 1
+            if self._size >= self.max_pending * self.EARLY_FLUSH:
+                self._wake.set()
+        values[key] = value
+
+    def get(self, column, key, default=None):
+        # Valeur en attente ou en cours d'écriture (lecture de ses propres écritures)
+        group = (column.class_, column.key)
+        for values in (self._pending, self._in_flight):
+            if key in values.get(group, {}):
+                return values[group][key]
+        return default
+
+    async def discard(self, column, key):
+        # Une écriture directe plus récente remplace la valeur en attente. Une écriture par lot en
+        # cours a déjà retiré ses valeurs de _pending : on attend son commit, sinon elle pourrait
+        # passer après l'écriture directe et la remplacer par une valeur plus ancienne.
+        async with self._flush_lock:
+            if self._pending.get((column.class_, column.key), {}).pop(key, None) is not None:
+                self._size -= 1
+
+    def _restore(self, pending: dict):
+        # Échec d'écriture : les valeurs reviennent, sauf si une plus récente est arrivée entre-temps
+        for group, values in pending.items():
+            current = self._pending.setdefault(group, {})
+            for key, value in values.items():
+                if key not in current and self._size < self.max_pending:
+                    current[key] = value
+                    self._size += 1
+                elif key not in current:
+                    self.dropped += 1
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            pending, self._pending, self._size = self._pending, {}, 0
+            self._wake.clear()
+            rows = sum(len(values) for values in pending.values())
+            if not rows:
+                return 0
+            self._in_flight = pending
+            start = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    for (model, name), values in pending.items():
+                        column, key_column = getattr(model, name), getattr(model, self._key_columns[(model, name)])
+                        items = list(values.items())
+                        for i in range(0, len(items), self.batch_size):
+                            chunk = dict(items[i:i + self.batch_size])
+                            await db.execute(
+                                update(model).where(key_column.in_(chunk))
+                                .values({column: case(chunk, value=key_column)})
+                                .execution_options(synchronize_session=False)
+                            )
+                    await db.commit()
+            except Exception:
+                self.failures += 1
+                self._restore(pending)
+                raise
+            except asyncio.CancelledError:
+                # Arrêt pendant une écriture : la passe finale (lifespan) les réécrit
+                self._restore(pending)
+                raise
+            finally:
+                self._in_flight = {}
+                self.durations.observe(time.perf_counter() - start)
+            self.written += rows
+            return rows
+
+    async def flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+
+write_behind = WriteBehindBuffer(settings.WRITE_BEHIND_FLUSH_SECONDS, settings.WRITE_BEHIND_MAX_PENDING,
+                                 settings.WRITE_BEHIND_BATCH_SIZE)
+
+
+def record_login(user_id: int, when):
+    write_behind.set(models.User.last_login, models.User.id, user_id, when)
+
+
+def record_presence(user_id: int, available: bool):
+    write_behind.set(models.UserProfile.is_available_now, models.UserProfile.user_id, user_id, available)
+
+
+@collector
+def _write_behind_samples():
+    return (
+        metric_lines("write_behind_pending", "gauge", "Buffered updates not yet written", [({}, len(write_behind))])
+        + metric_lines("write_behind_rows_written_total", "counter", "Rows updated by batched flushes", [({}, write_behind.written)])
+        + metric_lines("write_behind_coalesced_total", "counter", "Updates merged into a pending value", [({}, write_behind.coalesced)])
+        + metric_lines("write_behind_dropped_total", "counter", "Updates dropped because the buffer was full", [({}, write_behind.dropped)])
+        + metric_lines("write_behind_flush_failures_total", "counter", "Flushes that failed and were retried", [({}, write_behind.failures)])
+        + metric_lines("write_behind_flush_duration_seconds", "histogram", "Duration of a batched flush", [])
+        + write_behind.durations.samples("write_behind_flush_duration_seconds")
+    )